@@ -1,16 +1,112 @@
-from flask import Flask, request, render_template_string, jsonify
-from query_interface import query_bugzilla
+from flask import Flask, Response, request, render_template_string, jsonify, stream_with_context
+from query_interface import (
+    RETRIEVE_K, STAGE_SECONDS, stream_bugzilla, query_bugzilla_batch, generate_answer, warm_up, format_timings, get_facets,
+    query_cache,
+)
+from bug_filters import normalize_filters
+from bug_store import BUG_DB, BugStore
+from job_queue import JobScheduler, QueueFull
+from metrics import REGISTRY, Trace, timed
 import markdown2
+import functools
+import html
+import json
+import logging
+import math
+import os
 import threading
 import time
-from collections import deque
 
 app = Flask(__name__)
 
-# Track processing requests and durations
-processing_requests = 0
-request_durations = deque(maxlen=50)
+# Ollama answers one request at a time unless OLLAMA_NUM_PARALLEL is raised; more
+# workers than that only make concurrent questions compete for the same CPU
+LLM_WORKERS = 1
+MAX_QUEUED_JOBS = 20
+# Jobs whose client has not polled or read the stream for this long are cancelled
+JOB_ABANDON_SECONDS = 30
+
+# /api/query batches retrieve outside the job queue, but every answer they need is a job
+# like an interactive question, so LLM_WORKERS bounds all generation. One batch at a time
+# keeps them from crowding out interactive questions
+MAX_BATCH_QUESTIONS = 500
+MAX_CONCURRENT_BATCHES = 1
+BATCH_RETRY_AFTER = 60
+# Seconds a batch waits in total for room in a full job queue; answers that would wait
+# longer fail with "queue full" so the batch still finishes
+BATCH_QUEUE_WAIT = BATCH_RETRY_AFTER
+MAX_K = 20
+
+INDEX_METRICS_FILE = "index_metrics.prom"  # written by index_bugs_to_chroma.py
+TRACE_DIR = None  # e.g. "traces" to write a JSON timeline of every question
+# Written by download_bugzilla.py (output_file = "bug_reports.sqlite3") or bug_store.py import;
+# when it exists, every source links to its full bug report
+BUG_STORE_DB = BUG_DB
+
+REQUESTS = REGISTRY.counter("bugzilla_rag_requests_total", "Questions by outcome.", ["outcome"])
+JOBS = REGISTRY.gauge("bugzilla_rag_jobs", "Questions currently running or waiting.", ["state"])
+CACHE_ENTRIES = REGISTRY.gauge("bugzilla_rag_cache_entries", "Answers held by the query cache.")
+
+def answer_batch_question(result):
+    # An /api/query question whose sources were found by query_bugzilla_batch()
+    start_time = time.time()
+    yield {"event": "sources", "documents": result["source_documents"], "filters": result["filters"]}
+    answer = generate_answer(result["question"], result["source_documents"], result.get("vector"))
+    yield {"event": "done", "result": answer, "elapsed_time": time.time() - start_time, "cached": None}
+
+def run_job(job):
+    if "batch" in job.options:
+        # Counted by /api/query itself
+        yield from answer_batch_question(job.options["batch"])
+        return
+    trace = Trace("question", job.id, started=job.created, question=job.question)
+    trace.add("queue", job.created, job.started - job.created)
+    STAGE_SECONDS.observe(job.started - job.created, stage="queue")
+    outcome = "failed"
+    try:
+        yield from stream_bugzilla(job.question, trace=trace, filters=job.options.get("filters"))
+        outcome = "done"
+    except GeneratorExit:
+        outcome = "cancelled"
+        raise
+    finally:
+        REQUESTS.inc(outcome=outcome)
+        if TRACE_DIR:
+            trace.write(TRACE_DIR)
+
+scheduler = JobScheduler(run_job, LLM_WORKERS, MAX_QUEUED_JOBS, JOB_ABANDON_SECONDS)
+batch_slots = threading.BoundedSemaphore(MAX_CONCURRENT_BATCHES)
 lock = threading.Lock()
+engine_ready = False
+
+def answer_in_scheduler(result, queue_wait):
+    # Generates one batch answer as a scheduler job. While the queue is full it waits,
+    # taking the time from queue_wait["seconds"], which all answers of a batch share
+    while True:
+        try:
+            job = scheduler.submit(result["question"], {"batch": result}, record_timings=False)
+            break
+        except QueueFull:
+            if queue_wait["seconds"] <= 0:
+                return None, "queue full"
+            time.sleep(1)
+            queue_wait["seconds"] -= 1
+    for event in scheduler.follow(job):
+        if event["event"] == "done":
+            return event["result"], None
+        if event["event"] == "failed":
+            return None, event["error"]
+    return None, "cancelled"
+
+bug_store = None
+
+def get_bug_store():
+    global bug_store
+    if bug_store is None and os.path.exists(BUG_STORE_DB):
+        with lock:
+            if bug_store is None:
+                bug_store = BugStore(BUG_STORE_DB)
+    return bug_store
 
 TEMPLATE = """
 <!doctype html>
@@ -22,6 +118,9 @@ TEMPLATE = """
     .response { background: #f9f9f9; padding: 1em; border-radius: 8px; margin-top: 1em; }
     .source-snippet { margin-top: 1em; padding: 1em; background: #fafafa; border: 1px solid #ccc; border-radius: 6px; }
     textarea { width: 100%; font-size: 1em; padding: 0.5em; }
+    .filters { display: flex; flex-wrap: wrap; gap: 0.5em; margin-top: 0.5em; font-size: 0.9em; }
+    .filters label { display: flex; flex-direction: column; }
+    .applied-filters { font-size: 0.9em; color: #555; }
     button { padding: 0.5em 1em; font-size: 1em; margin-top: 0.5em; }
     #loading { display: none; color: #555; font-style: italic; margin-top: 1em; }
     .notice { font-size: 0.9em; color: #444; margin-bottom: 1em; background: #eef; padding: 1em; border-radius: 6px; }
@@ -32,16 +131,134 @@ TEMPLATE = """
       document.getElementById("ask-btn").disabled = true;
     }
 
+    function hideLoading() {
+      document.getElementById("loading").style.display = "none";
+      document.getElementById("ask-btn").disabled = false;
+    }
+
+    function showError(message) {
+      const error = document.createElement("div");
+      error.style.color = "red";
+      error.textContent = message;
+      document.getElementById("stream-answer").replaceChildren(error);
+    }
+
+    function renderSources(sources) {
+      const container = document.getElementById("stream-sources");
+      container.innerHTML = "";
+      for (const doc of sources) {
+        const snippet = document.createElement("div");
+        snippet.className = "source-snippet";
+        if (doc.bug_link) {
+          const title = document.createElement("strong");
+          const link = document.createElement("a");
+          link.href = doc.bug_link;
+          link.target = "_blank";
+          link.textContent = doc.bug_id;
+          title.append("Bug ID: ", link);
+          if (doc.full_link) {
+            const full = document.createElement("a");
+            full.href = doc.full_link;
+            full.target = "_blank";
+            full.textContent = "full report";
+            title.append(" · ", full);
+          }
+          snippet.append(title, document.createElement("br"));
+        }
+        const content = document.createElement("pre");
+        content.textContent = doc.content;
+        snippet.append(content);
+        container.append(snippet);
+      }
+    }
+
+    // Streams the answer over Server-Sent Events; without EventSource the form posts as before
+    function askStreaming(event) {
+      if (!window.EventSource) {
+        showLoading();
+        return true;
+      }
+      event.preventDefault();
+      const question = document.getElementById("question").value;
+      if (!question.trim()) {
+        return false;
+      }
+
+      showLoading();
+      document.getElementById("loading").innerText = "⏳ Searching bug records...";
+      document.getElementById("server-result").style.display = "none";
+      document.getElementById("stream-result").style.display = "block";
+      document.getElementById("stream-title").innerText = "✅ Answer:";
+      document.getElementById("stream-answer").innerHTML = "";
+      document.getElementById("stream-sources").innerHTML = "";
+
+      let text = "";
+      let received = false;
+      const params = new URLSearchParams({question: question});
+      for (const field of ["product", "component", "status", "reported_after", "reported_before"]) {
+        const value = document.getElementById("filter-" + field).value;
+        if (value) {
+          params.set(field, value);
+        }
+      }
+      const source = new EventSource("/stream?" + params.toString());
+      source.addEventListener("queued", (e) => {
+        received = true;
+        const data = JSON.parse(e.data);
+        document.getElementById("loading").innerText =
+          `⏳ Waiting in line at position ${data.position}, answer expected in ~${data.eta} seconds...`;
+      });
+      source.addEventListener("sources", (e) => {
+        received = true;
+        const data = JSON.parse(e.data);
+        renderSources(data.sources);
+        document.getElementById("stream-filters").innerText = data.filters ? "Filtered by " + data.filters : "";
+        document.getElementById("loading").innerText = "⏳ Generating answer...";
+      });
+      // Tokens are shown as plain text; the Markdown of the whole answer comes rendered
+      // (and escaped) by the server with the "done" event
+      source.addEventListener("token", (e) => {
+        text += JSON.parse(e.data).text;
+        const answer = document.createElement("div");
+        answer.style.whiteSpace = "pre-wrap";
+        answer.textContent = text;
+        document.getElementById("stream-answer").replaceChildren(answer);
+      });
+      source.addEventListener("done", (e) => {
+        const data = JSON.parse(e.data);
+        document.getElementById("stream-answer").innerHTML = data.html;
+        document.getElementById("stream-title").innerText =
+          `✅ Answer (in ${data.elapsed_time.toFixed(2)} seconds${data.cached ? ", from cache" : ""}):`;
+        source.close();
+        hideLoading();
+        updateStatus();
+      });
+      source.addEventListener("failed", (e) => {
+        showError("Error: " + JSON.parse(e.data).error);
+        source.close();
+        hideLoading();
+      });
+      source.onerror = () => {
+        // Before any event arrived this is most likely a full queue (503)
+        if (!received) {
+          showError("The server is busy, please try again in a moment.");
+        }
+        source.close();
+        hideLoading();
+      };
+      return false;
+    }
+
     async function updateStatus() {
       const res = await fetch('/status');
       const data = await res.json();
       document.getElementById("status").innerText =
-        `${data.processing} request(s) in progress`;
+        `${data.processing} request(s) in progress, ${data.queued} waiting`;
 
       const etaRes = await fetch('/eta');
       const eta = await etaRes.json();
       document.getElementById("eta").innerText =
-        `Estimated wait time: ~${eta.eta} seconds`;
+        `Estimated wait time: ~${eta.eta} seconds (up to ${eta.eta_p90})`;
     }
 
     window.onload = updateStatus;
@@ -60,7 +277,7 @@ TEMPLATE = """
     <p>
     It uses an efficient sentence embedding model (<code>all-MiniLM-L6-v2</code>) to find relevant documents based on semantic similarity, then passes those to a language model (like LLaMA via Ollama) to generate a context-aware answer.
     </p>
-    The system tracks how many queries are being processed in real time and tries to estimates the expected wait time using a sliding window of recent request durations.
+    The system runs questions through a small queue of language model workers and estimates the expected wait time from the queue position and recent timings of each processing stage.
     This helps inform users about server load before they submit their question.
     The entire pipeline runs on VM with limited resources, proving that large-scale semantic search and generative QA are possible without cloud GPUs.
     <p>
@@ -75,86 +292,377 @@ TEMPLATE = """
   <div id="status">Checking current load...</div>
   <div id="eta"></div>
 
-  <form method="post" onsubmit="showLoading()">
-    <textarea name="question" rows="4" placeholder="Enter your question here...">{{ question }}</textarea><br>
+  <form method="post" onsubmit="return askStreaming(event)">
+    <textarea id="question" name="question" rows="4" placeholder="Enter your question here...">{{ question }}</textarea><br>
+    <div class="filters">
+      <label>Product
+        <input id="filter-product" name="product" list="products" value="{{ form.product }}">
+      </label>
+      <label>Component
+        <input id="filter-component" name="component" list="components" value="{{ form.component }}">
+      </label>
+      <label>Status
+        <select id="filter-status" name="status">
+          <option value="">any</option>
+          <option value="open" {% if form.status == "open" %}selected{% endif %}>open</option>
+          <option value="closed" {% if form.status == "closed" %}selected{% endif %}>closed</option>
+        </select>
+      </label>
+      <label>Reported after
+        <input id="filter-reported_after" name="reported_after" type="date" value="{{ form.reported_after }}">
+      </label>
+      <label>Reported before
+        <input id="filter-reported_before" name="reported_before" type="date" value="{{ form.reported_before }}">
+      </label>
+    </div>
+    <datalist id="products">{% for value in facets.product %}<option value="{{ value }}">{% endfor %}</datalist>
+    <datalist id="components">{% for value in facets.component %}<option value="{{ value }}">{% endfor %}</datalist>
     <button id="ask-btn" type="submit">Ask</button>
   </form>
 
   <div id="loading">⏳ Processing your question...</div>
 
+  <div id="stream-result" style="display: none;">
+    <h2 id="stream-title">✅ Answer:</h2>
+    <div class="applied-filters" id="stream-filters"></div>
+    <div class="response" id="stream-answer"></div>
+    <h3>📄 Top Source Snippets:</h3>
+    <div id="stream-sources"></div>
+  </div>
+
+  <div id="server-result">
   {% if answer %}
-  <h2>✅ Answer (in {{ time }} seconds):</h2>
+  <h2>✅ Answer (in {{ time }} seconds{% if cached %}, from cache{% endif %}):</h2>
+  {% if applied_filters %}<div class="applied-filters">Filtered by {{ applied_filters }}</div>{% endif %}
   <div class="response">{{ answer|safe }}</div>
 
   <h3>📄 Top Source Snippets:</h3>
   {% for doc in sources %}
     <div class="source-snippet">
       {% if doc.bug_link %}
-        <strong>Bug ID: <a href="{{ doc.bug_link }}" target="_blank">{{ doc.bug_id }}</a></strong><br>
+        <strong>Bug ID: <a href="{{ doc.bug_link }}" target="_blank">{{ doc.bug_id }}</a>{% if doc.full_link %} · <a href="{{ doc.full_link }}" target="_blank">full report</a>{% endif %}</strong><br>
       {% endif %}
       <pre>{{ doc.content }}</pre>
     </div>
   {% endfor %}
   {% endif %}
+  </div>
+</body>
+</html>
+"""
+
+BUG_TEMPLATE = """
+<!doctype html>
+<html>
+<head>
+  <title>Bug {{ bug.bug_number }}: {{ bug.title }}</title>
+  <style>
+    body { font-family: sans-serif; max-width: 800px; margin: auto; padding: 2em; }
+    .comment { margin-top: 1em; padding: 1em; background: #fafafa; border: 1px solid #ccc; border-radius: 6px; }
+    pre { white-space: pre-wrap; }
+  </style>
+</head>
+<body>
+  <h1>Bug <a href="{{ bug_link }}" target="_blank">{{ bug.bug_number }}</a>: {{ bug.title }}</h1>
+  <p>{{ bug.Product }} {{ bug.version }} | {{ bug.Component }} | {{ bug.Status }} | reported {{ bug.Reported }}</p>
+  {% for comment in bug.Comments %}
+    <div class="comment">
+      <strong>{{ comment.name }}</strong>, {{ comment.date }}
+      <pre>{{ comment.text }}</pre>
+    </div>
+  {% endfor %}
 </body>
 </html>
 """
 
+def format_sources(documents):
+    sources = []
+    has_store = get_bug_store() is not None
+    for doc in documents:
+        content = doc.page_content[:1000]
+        bug_id = doc.metadata.get("bug_id") if doc.metadata else None
+        bug_link = f"https://bugzilla.suse.com/show_bug.cgi?id={bug_id}" if bug_id else None
+        full_link = f"/bug/{bug_id}" if bug_id and has_store else None
+        sources.append({"content": content, "bug_id": bug_id, "bug_link": bug_link, "full_link": full_link})
+    return sources
+
+def describe_filters(filters):
+    parts = []
+    for field, value in filters.items():
+        if field.startswith("reported_"):
+            date = time.strftime("%Y-%m-%d", time.gmtime(value))
+            parts.append(f"reported {field.split('_')[1]} {date}")
+        else:
+            parts.append(f"{field}: {', '.join(value)}")
+    return "; ".join(parts)
+
+def render_answer(text):
+    # Model output is untrusted: raw HTML in it is escaped and unsafe link targets dropped
+    return markdown2.markdown(text, safe_mode="escape")
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     question = ""
     html_answer = ""
     sources = []
     time_taken = ""
+    cached = False
+    applied_filters = ""
+    status_code = 200
 
     if request.method == "POST":
         question = request.form["question"]
         if question.strip():
             start_time = time.time()
-            with lock:
-                global processing_requests
-                processing_requests += 1
             try:
-                result = query_bugzilla(question)
-                html_answer = markdown2.markdown(result["result"])
-                sources = []
-                for doc in result["source_documents"]:
-                    content = doc.page_content[:1000]
-                    bug_id = doc.metadata.get("bug_id") if doc.metadata else None
-                    bug_link = f"https://bugzilla.suse.com/show_bug.cgi?id={bug_id}" if bug_id else None
-                    sources.append({"content": content, "bug_id": bug_id, "bug_link": bug_link})
-                elapsed = result["elapsed_time"]
-            except Exception as e:
-                html_answer = f"<div style='color:red;'>Error: {str(e)}</div>"
-                elapsed = time.time() - start_time
-            finally:
-                with lock:
-                    processing_requests -= 1
-                    request_durations.append(elapsed)
-                time_taken = f"{elapsed:.2f}"
+                job = scheduler.submit(question, {"filters": normalize_filters(request.form)})
+            except QueueFull:
+                REQUESTS.inc(outcome="rejected")
+                html_answer = "<div style='color:red;'>The server is busy, please try again in a moment.</div>"
+                status_code = 503
+            else:
+                for event in scheduler.follow(job):
+                    if event["event"] == "sources":
+                        with timed(STAGE_SECONDS, stage="render"):
+                            sources = format_sources(event["documents"])
+                        applied_filters = describe_filters(event["filters"])
+                    elif event["event"] == "done":
+                        with timed(STAGE_SECONDS, stage="render"):
+                            html_answer = render_answer(event["result"])
+                        cached = event["cached"] is not None
+                    elif event["event"] == "failed":
+                        html_answer = f"<div style='color:red;'>Error: {html.escape(event['error'])}</div>"
+                # Includes the time spent waiting in the queue
+                time_taken = f"{time.time() - start_time:.2f}"
 
     return render_template_string(
         TEMPLATE,
         question=question,
         answer=html_answer,
         sources=sources,
-        time=time_taken
+        time=time_taken,
+        cached=cached,
+        applied_filters=applied_filters,
+        form=request.form,
+        facets=get_facets(),
+    ), status_code
+
+def busy_response(retry_after=None):
+    REQUESTS.inc(outcome="rejected")
+    response = jsonify({"error": "Too many questions are waiting, please try again later"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after or math.ceil(scheduler.estimate()["eta"]))
+    return response
+
+def job_status(job):
+    status = {"job_id": job.id, "state": job.state, "position": scheduler.position(job), **scheduler.estimate(job)}
+    text = []
+    for event in list(job.events):
+        if event["event"] == "sources":
+            status["sources"] = format_sources(event["documents"])
+            status["filters"] = event["filters"]
+        elif event["event"] == "token":
+            text.append(event["text"])
+        elif event["event"] == "done":
+            status.update(elapsed_time=event["elapsed_time"], cached=event["cached"])
+        elif event["event"] == "failed":
+            status["error"] = event["error"]
+    status["answer"] = "".join(text)
+    return status
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = request.form
+        filters = normalize_filters(request.form)
+    else:
+        filters = normalize_filters(payload.get("filters") or {})
+    question = payload.get("question", "")
+    if not question.strip():
+        return jsonify({"error": "Empty question"}), 400
+    try:
+        job = scheduler.submit(question, {"filters": filters})
+    except QueueFull:
+        return busy_response()
+    return jsonify(job_status(job)), 202
+
+@app.route("/bug/<int:bug_number>")
+def bug_report(bug_number):
+    # The whole record from the bug store, where sources only show the retrieved chunk
+    store = get_bug_store()
+    bug = store.get(bug_number) if store is not None else None
+    if bug is None:
+        return "Unknown bug", 404
+    return render_template_string(
+        BUG_TEMPLATE, bug=bug, bug_link=f"https://bugzilla.suse.com/show_bug.cgi?id={bug_number}"
     )
 
+@app.route("/api/bug/<int:bug_number>")
+def api_bug(bug_number):
+    # ?fields=title,Status limits the record to those keys; Comments are only read when asked for
+    fields = [field.strip() for field in request.args.get("fields", "").split(",") if field.strip()] or None
+    store = get_bug_store()
+    bug = store.get(bug_number, fields) if store is not None else None
+    if bug is None:
+        return jsonify({"error": "Unknown bug"}), 404
+    return jsonify(bug)
+
+@app.route("/jobs/<job_id>")
+def get_job(job_id):
+    # Polling keeps the job alive; clients that stop polling get their job cancelled
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_status(job))
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = scheduler.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_status(job))
+
+@app.route("/stream")
+def stream():
+    question = request.args.get("question", "")
+    if not question.strip():
+        return jsonify({"error": "Empty question"}), 400
+
+    try:
+        job = scheduler.submit(question, {"filters": normalize_filters(request.args)})
+    except QueueFull:
+        return busy_response()
+
+    def generate():
+        try:
+            for event in scheduler.follow(job):
+                if event["event"] == "queued":
+                    yield sse_event("queued", {"job_id": job.id, "position": event["position"], "eta": event["eta"]})
+                elif event["event"] == "heartbeat":
+                    # Writing something is the only way to notice that the client went away
+                    yield ": heartbeat\n\n"
+                elif event["event"] == "sources":
+                    with timed(STAGE_SECONDS, stage="render"):
+                        data = sse_event("sources", {
+                            "sources": format_sources(event["documents"]),
+                            "filters": describe_filters(event["filters"]),
+                        })
+                    yield data
+                elif event["event"] == "token":
+                    yield sse_event("token", {"text": event["text"]})
+                elif event["event"] == "done":
+                    with timed(STAGE_SECONDS, stage="render"):
+                        data = sse_event("done", {
+                            "elapsed_time": event["elapsed_time"], "cached": event["cached"], "html": render_answer(event["result"]),
+                        })
+                    yield data
+                else:
+                    yield sse_event("failed", {"error": event["error"]})
+        finally:
+            # Runs when the client disconnects too, which stops the job early
+            scheduler.cancel(job.id)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/api/query", methods=["POST"])
+def api_query():
+    # {"questions": [...], "filters": {...}, "k": 3, "sources_only": false}; "question" works for one
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    questions = payload.get("questions", [payload["question"]] if "question" in payload else None)
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        return jsonify({"error": "Expected a non-empty list of non-empty questions"}), 400
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_QUESTIONS} questions per request"}), 413
+    try:
+        k = int(payload.get("k", RETRIEVE_K))
+    except (TypeError, ValueError):
+        k = 0
+    if not 1 <= k <= MAX_K:
+        return jsonify({"error": f"k must be between 1 and {MAX_K}"}), 400
+    sources_only = bool(payload.get("sources_only"))
+
+    if not batch_slots.acquire(blocking=False):
+        return busy_response(BATCH_RETRY_AFTER)
+    start_time = time.time()
+    try:
+        results = query_bugzilla_batch(
+            questions, k, normalize_filters(payload.get("filters") or {}), sources_only,
+            max_concurrency=LLM_WORKERS,
+            answer=functools.partial(answer_in_scheduler, queue_wait={"seconds": BATCH_QUEUE_WAIT}),
+        )
+    finally:
+        batch_slots.release()
+
+    response = []
+    for result in results:
+        REQUESTS.inc(outcome="failed" if "error" in result else "done")
+        item = {
+            "question": result["question"],
+            "sources": format_sources(result["source_documents"]),
+            "filters": result["filters"],
+            "cached": result["cached"],
+        }
+        if not sources_only:
+            item.update({"answer": result["result"]} if "result" in result else {"error": result["error"]})
+        response.append(item)
+    return jsonify({"results": response, "elapsed_time": time.time() - start_time})
+
 @app.route("/status")
 def status():
+    jobs = scheduler.snapshot()
     with lock:
-        return jsonify({"processing": processing_requests})
+        ready = engine_ready
+    return jsonify({
+        "processing": jobs["running"],
+        "queued": jobs["queued"],
+        "ready": ready,
+        "jobs": jobs,
+        "cache": query_cache.snapshot(),
+    })
+
+@app.route("/metrics")
+def metrics():
+    jobs = scheduler.snapshot()
+    JOBS.set(jobs["running"], state="running")
+    JOBS.set(jobs["queued"], state="queued")
+    CACHE_ENTRIES.set(query_cache.snapshot()["size"])
+    text = REGISTRY.render()
+    # The indexer runs as its own process and leaves its latest numbers in a file
+    if os.path.exists(INDEX_METRICS_FILE):
+        with open(INDEX_METRICS_FILE) as f:
+            text += f.read()
+    return Response(text, mimetype="text/plain; version=0.0.4")
 
 @app.route("/eta")
 def eta():
+    # Time until a question submitted now would be answered, from the queue and stage timings
+    return jsonify(scheduler.estimate())
+
+def warm_up_engine():
+    global engine_ready
+    try:
+        timings = warm_up()
+    except Exception as e:
+        print(f"Query engine warm-up failed: {e}")
+        return
     with lock:
-        if request_durations:
-            avg = sum(request_durations) / len(request_durations)
-        else:
-            avg = 6.0  # fallback estimate in seconds
-        estimate = processing_requests * avg
-    return jsonify({"eta": round(estimate, 1)})
+        engine_ready = True
+    print(f"Query engine ready after a cold start of {timings['total']:.2f} seconds ({format_timings(timings)}).")
 
 if __name__ == "__main__":
+    # Shows the per-question context compression logged by query_interface
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # With the debug reloader only the serving child process should load the models
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        threading.Thread(target=warm_up_engine, daemon=True).start()
     app.run(host="0.0.0.0", port=5000, debug=True)
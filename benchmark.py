@@ -0,0 +1,635 @@
+import argparse
+import datetime
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+import numpy as np
+from jsonl_store import JsonlStore, iter_bugs
+
+BENCH_DIR = "benchmark"
+RESULTS_FILE = "benchmark_results.json"
+STAGES = ("download", "index", "query")
+
+# Synthetic corpus
+CORPUS_BUGS = 2000
+COMMENTS_PER_BUG = 6  # mean; every bug has at least one
+COMMENT_CHARS = 400  # median comment length; lengths are log-normal around it
+COMMENT_SIGMA = 1.0  # spread of the log-normal, 0 for comments of equal length
+MAX_COMMENT_CHARS = 20000
+STACK_TRACE_RATE = 0.1  # share of comments that end with a kernel or Java stack trace
+FIRST_BUG_ID = 1000000
+
+PRODUCTS = {
+    "SUSE Linux Enterprise Server 15": ["Kernel", "Installation", "Network", "Storage", "YaST2"],
+    "SUSE Linux Enterprise Desktop 15": ["GNOME", "Printing", "Sound", "X.Org"],
+    "openSUSE Tumbleweed": ["Kernel", "Basesystem", "KDE Workspace (Plasma)", "Packaging"],
+    "SUSE Manager 4.3": ["Salt", "Server", "Client"],
+}
+VERSIONS = ["GM", "SP1", "SP2", "SP3", "SP4", "SP5", "Current"]
+STATUSES = ["NEW", "CONFIRMED", "IN_PROGRESS", "RESOLVED", "RESOLVED", "RESOLVED", "VERIFIED"]
+WORDS = (
+    "the a to is in of and it when after with not on for boot kernel panic fails error update package "
+    "install system driver module network interface timeout crash segfault memory disk mount btrfs xfs "
+    "service systemd journal log patch fix regression reproduce upstream backport version release build "
+    "firmware device usb nvme raid lvm partition snapshot rollback zypper rpm repository dependency "
+    "conflict yast installer grub bootloader efi secure selinux apparmor permission denied user root "
+    "login ssh firewall dns dhcp wicked networkmanager bond vlan bridge container podman docker "
+    "virtual kvm xen qemu libvirt migration cpu load performance slow hang deadlock lock thread process "
+    "signal core dump trace stack backtrace attached please provide supportconfig output verified works "
+    "confirmed duplicate closed fixed maintenance"
+).split()
+WORD_ARRAY = np.array(WORDS)
+WORD_WEIGHTS = 1.0 / np.arange(1, len(WORDS) + 1)  # Zipf-like: a few words are very common
+WORD_WEIGHTS /= WORD_WEIGHTS.sum()
+STUB_ANSWER = "The bug was fixed by a maintenance update of the affected package; see the linked comments."
+
+# Mock Bugzilla
+MOCK_LATENCY_MS = 20
+MOCK_JITTER_MS = 10
+MOCK_BANDWIDTH_MBPS = 0  # simulated link speed for response bodies, 0 for unlimited
+MOCK_RETRY_AFTER = 1  # seconds, sent with injected 429 and 503 responses
+
+# Download benchmark: the mock has no rate limit of its own, so the keys are generous
+BENCH_KEYS = 4
+BENCH_KEY_RATE = 50.0
+
+QUERY_COUNT = 50
+
+# Higher is better for these, lower for everything else compare() reports
+COMPARED = [
+    ("download", "bugs_per_second", True),
+    ("download", "wire_mb", False),
+    ("download", "peak_rss_mb", False),
+    ("index", "documents_per_second", True),
+    ("index", "bugs_per_second", True),
+    ("index", "peak_rss_mb", False),
+    ("index", "peak_worker_rss_mb", False),
+    ("query", "cold_seconds", False),
+    ("query", "p50_ms", False),
+    ("query", "p95_ms", False),
+]
+
+
+def words(rng, count):
+    return " ".join(rng.choice(WORD_ARRAY, size=max(1, count), p=WORD_WEIGHTS))
+
+
+def stack_trace(rng):
+    # Lines that context_budget.STACK_TRACE_LINE recognizes, as in real kernel and Java reports
+    lines = int(rng.integers(8, 40))
+    if rng.random() < 0.5:
+        start = rng.uniform(1, 5000)
+        return "\n".join(
+            f"[{start + i * 0.000013:12.6f}]  {rng.choice(WORD_ARRAY)}_{rng.choice(WORD_ARRAY)}+0x{rng.integers(16, 4096):x}/0x{rng.integers(4096, 8192):x}"
+            for i in range(lines)
+        )
+    return "java.lang.IllegalStateException: " + words(rng, 6) + "\n" + "\n".join(
+        f"    at org.example.{rng.choice(WORD_ARRAY)}.{rng.choice(WORD_ARRAY).title()}.{rng.choice(WORD_ARRAY)}({rng.choice(WORD_ARRAY).title()}.java:{rng.integers(10, 900)})"
+        for _ in range(lines)
+    )
+
+
+def synthetic_bug(rng, bug_id, reported, comments_per_bug, comment_chars, comment_sigma, stack_trace_rate):
+    product = rng.choice(list(PRODUCTS))
+    comments = []
+    date = reported
+    for _ in range(1 + rng.poisson(max(0.0, comments_per_bug - 1))):
+        length = int(min(MAX_COMMENT_CHARS, comment_chars * rng.lognormal(0.0, comment_sigma)))
+        text = words(rng, length // 6)
+        if rng.random() < stack_trace_rate:
+            text += "\n" + stack_trace(rng)
+        comments.append({"name": f"user{rng.integers(1, 500)}@example.com", "date": date.strftime("%Y-%m-%dT%H:%M:%SZ"), "text": text})
+        date += datetime.timedelta(hours=float(rng.exponential(72)))
+    return {
+        "bug_number": bug_id,
+        "title": words(rng, int(rng.integers(4, 12))).capitalize(),
+        "Product": product,
+        "version": rng.choice(VERSIONS),
+        "Component": rng.choice(PRODUCTS[product]),
+        "Reported": reported.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "Status": rng.choice(STATUSES),
+        "Comments": comments,
+    }
+
+
+def generate_corpus(path, bugs=CORPUS_BUGS, comments_per_bug=COMMENTS_PER_BUG, comment_chars=COMMENT_CHARS,
+                    comment_sigma=COMMENT_SIGMA, stack_trace_rate=STACK_TRACE_RATE, seed=0):
+    """Writes a synthetic corpus of bugs records in the downloader's format, as JSON Lines or a JSON array.
+
+    Bug numbers increase with gaps, report dates spread over 2010 to 2024, and comment
+    lengths are log-normal with the given median and spread. The same seed gives the same corpus.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    for stale in (path, path + ".offset"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    start = datetime.datetime(2010, 1, 1)
+    span = datetime.datetime(2024, 12, 31) - start
+    bug_id = FIRST_BUG_ID
+    comments = 0
+
+    as_array = path.endswith(".json")
+    store = open(path, "w", encoding="utf-8") if as_array else JsonlStore(path)
+    try:
+        if as_array:
+            store.write("[")
+        for i in range(bugs):
+            bug_id += int(rng.integers(1, 4))
+            reported = start + span * (i / max(1, bugs))
+            bug = synthetic_bug(rng, bug_id, reported, comments_per_bug, comment_chars, comment_sigma, stack_trace_rate)
+            comments += len(bug["Comments"])
+            if as_array:
+                store.write(("," if i else "") + "\n" + json.dumps(bug))
+            else:
+                store.append(bug)
+        if as_array:
+            store.write("\n]\n")
+    finally:
+        store.close()
+    return {"path": path, "bugs": bugs, "comments": comments, "mb": round(os.path.getsize(path) / 1024 ** 2, 1)}
+
+
+def api_bug(bug):
+    # A bug as /rest/bug returns it, including fields the downloader does not keep
+    comments = bug.get("Comments") or []
+    last_change = max([bug.get("Reported", "")] + [c.get("date", "") for c in comments])
+    return {
+        "id": bug["bug_number"],
+        "summary": bug.get("title", ""),
+        "product": bug.get("Product", ""),
+        "component": bug.get("Component", ""),
+        "version": bug.get("version", ""),
+        "status": bug.get("Status", ""),
+        "creation_time": bug.get("Reported", ""),
+        "last_change_time": last_change,
+        "resolution": "FIXED" if bug.get("Status") in ("RESOLVED", "VERIFIED") else "",
+        "priority": "P3 - Medium",
+        "severity": "Normal",
+        "op_sys": "SLES 15",
+        "platform": "x86-64",
+        "classification": "SUSE Linux Enterprise Server",
+        "assigned_to": "maintainers@example.com",
+        "creator": comments[0].get("name", "") if comments else "",
+        "cc": [c.get("name", "") for c in comments[:8]],
+        "keywords": [],
+        "whiteboard": "",
+        "url": "",
+        "see_also": [],
+        "depends_on": [],
+        "blocks": [],
+        "is_open": bug.get("Status") not in ("RESOLVED", "VERIFIED"),
+    }
+
+
+def api_comments(bug):
+    return [
+        {
+            "id": bug["bug_number"] * 100 + count,
+            "bug_id": bug["bug_number"],
+            "count": count,
+            "creator": comment.get("name", ""),
+            "creation_time": comment.get("date", ""),
+            "time": comment.get("date", ""),
+            "is_private": False,
+            "attachment_id": None,
+            "tags": [],
+            "text": comment.get("text", ""),
+        }
+        for count, comment in enumerate(bug.get("Comments") or [])
+    ]
+
+
+def project(item, fields):
+    return {key: value for key, value in item.items() if key in fields} if fields else item
+
+
+class MockBugzilla(ThreadingHTTPServer):
+    """/rest/bug and /rest/bug/<id>/comment over a corpus, with injectable latency and throttling.
+
+    Supports what the downloader sends: offset/limit paging, order, include_fields, gzip,
+    last_change_time, count_only, id lists and f1/o1/v1 ranges on bug_id, creation_ts
+    and delta_ts. rate_429 and rate_503 are the share of requests answered with that
+    status and Retry-After. Comment requests only answer for existing bugs that were
+    asked for; with path_id_only, only for the bug in the path, like servers that ignore
+    ?ids=. /__stats returns the responses sent so far.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, bugs, latency_ms=MOCK_LATENCY_MS, jitter_ms=MOCK_JITTER_MS, rate_429=0.0, rate_503=0.0,
+                 retry_after=MOCK_RETRY_AFTER, bandwidth_mbps=MOCK_BANDWIDTH_MBPS, path_id_only=False, seed=0):
+        super().__init__(address, MockHandler)
+        bugs = sorted(bugs, key=lambda bug: bug["bug_number"])
+        self.bugs = [api_bug(bug) for bug in bugs]
+        self.comments = {bug["bug_number"]: api_comments(bug) for bug in bugs}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.retry_after = retry_after
+        self.bandwidth_mbps = bandwidth_mbps
+        self.path_id_only = path_id_only
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "status": {}}
+
+    def count(self, status, size):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            self.stats["status"][str(status)] = self.stats["status"].get(str(status), 0) + 1
+
+    def search(self, query):
+        bugs = self.bugs
+        if "id" in query:
+            ids = {int(i) for value in query["id"] for i in value.split(",")}
+            bugs = [bug for bug in bugs if bug["id"] in ids]
+        if "last_change_time" in query:
+            bugs = [bug for bug in bugs if bug["last_change_time"] >= query["last_change_time"][0]]
+        n = 1
+        while f"f{n}" in query:
+            field = {"bug_id": "id", "creation_ts": "creation_time", "delta_ts": "last_change_time"}[query[f"f{n}"][0]]
+            operator, value = query[f"o{n}"][0], query[f"v{n}"][0]
+            if field == "id":
+                value = int(value)
+            compare = {
+                "greaterthaneq": lambda a, b: a >= b, "greaterthan": lambda a, b: a > b,
+                "lessthan": lambda a, b: a < b, "lessthaneq": lambda a, b: a <= b, "equals": lambda a, b: a == b,
+            }[operator]
+            bugs = [bug for bug in bugs if compare(bug[field], value)]
+            n += 1
+        if query.get("order", [""])[0].lower().endswith("desc"):
+            bugs = bugs[::-1]
+        return bugs
+
+    def respond(self, path, query):
+        fields = set(query.get("include_fields", [""])[0].split(",")) - {""}
+        if path.rstrip("/") == "/rest/bug":
+            bugs = self.search(query)
+            if query.get("count_only"):
+                return {"bug_count": len(bugs)}
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["0"])[0]) or len(bugs)
+            return {"bugs": [project(bug, fields) for bug in bugs[offset:offset + limit]]}
+
+        parts = path.strip("/").split("/")
+        if len(parts) == 4 and parts[:2] == ["rest", "bug"] and parts[3] == "comment":
+            ids = [int(parts[2])] + ([] if self.path_id_only else [int(i) for i in query.get("ids", [])])
+            return {
+                "bugs": {str(i): {"comments": [project(c, fields) for c in self.comments[i]]} for i in ids if i in self.comments},
+                "comments": {},
+            }
+        return None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status, len(body))
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/__stats":
+            with server.lock:
+                return self.send(200, json.dumps(server.stats).encode(), [("Content-Type", "application/json")])
+
+        time.sleep((server.latency_ms + server.random.uniform(0, server.jitter_ms)) / 1000)
+        roll = server.random.random()
+        if roll < server.rate_429 + server.rate_503:
+            return self.send(429 if roll < server.rate_429 else 503, headers=[("Retry-After", str(server.retry_after))])
+
+        data = server.respond(url.path, parse_qs(url.query))
+        if data is None:
+            return self.send(404, json.dumps({"error": True, "message": "not found"}).encode())
+        body = json.dumps(data).encode()
+        headers = [("Content-Type", "application/json")]
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, 6)
+            headers.append(("Content-Encoding", "gzip"))
+        if server.bandwidth_mbps:
+            time.sleep(len(body) * 8 / (server.bandwidth_mbps * 1e6))
+        self.send(200, body, headers)
+
+
+def serve_mock(corpus, port, ready=None, **options):
+    """Serves corpus (a bug file) on 127.0.0.1:port until the process ends; puts the port on ready."""
+    server = MockBugzilla(("127.0.0.1", port), list(iter_bugs(corpus)), **options)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    logging.info(f"Mock Bugzilla serving {len(server.bugs)} bugs at http://127.0.0.1:{server.server_address[1]}/rest/bug")
+    server.serve_forever()
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def redirect_output(path):
+    # Stage output (progress bars, per-request messages) goes to a log instead of the terminal
+    sys.stdout = sys.stderr = open(path, "a", buffering=1)
+
+
+def measure_download(directory, api_url, keys, rate, max_in_flight):
+    """Runs in a fresh process: a full export from the mock into directory."""
+    os.chdir(directory)
+    redirect_output("download.log")
+    import asyncio
+    import download_bugzilla
+    download_bugzilla.api_url = api_url
+    store = download_bugzilla.load_existing_data()
+    start = time.time()
+    complete = asyncio.run(download_bugzilla.fetch_bugs_async(store, dict(download_bugzilla.params), max_in_flight, keys, rate))
+    seconds = time.time() - start
+    store.close()
+    http = download_bugzilla.transport.stats
+    download_bugzilla.print_traffic()
+    return {
+        "complete": complete,
+        "bugs": store.count,
+        "comments": sum(len(bug.get("Comments") or []) for bug in iter_bugs(download_bugzilla.output_file)),
+        "seconds": round(seconds, 2),
+        "bugs_per_second": round(store.count / seconds, 1),
+        "requests": sum(stats["requests"] for stats in http.values()),
+        "wire_mb": round(sum(stats["wire_bytes"] for stats in http.values()) / 1024 ** 2, 2),
+        "decoded_mb": round(sum(stats["decoded_bytes"] for stats in http.values()) / 1024 ** 2, 2),
+        "http": http,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure_index(directory, corpus):
+    """Runs in a fresh process: indexes corpus into an empty chroma_db in directory."""
+    os.chdir(directory)
+    redirect_output("index.log")
+    import index_bugs_to_chroma as indexer
+    import chromadb
+    indexer.JSON_FILE = corpus
+    start = time.time()
+    indexer.main()
+    seconds = time.time() - start
+    bugs = indexer.open_checkpoint().execute("SELECT COUNT(*) FROM indexed").fetchone()[0]
+    documents = chromadb.PersistentClient(path=indexer.CHROMA_DIR).get_collection(indexer.COLLECTION_NAME).count()
+    return {
+        "bugs": bugs,
+        "documents": documents,
+        "seconds": round(seconds, 2),
+        "bugs_per_second": round(bugs / seconds, 1),
+        "documents_per_second": round(documents / seconds, 1),
+        "embed_workers": indexer.EMBED_WORKERS,
+        "peak_rss_mb": peak_rss_mb(),
+        # The largest embedding worker; the model is loaded once per worker
+        "peak_worker_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "chroma_mb": round(sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(indexer.CHROMA_DIR) for name in names
+        ) / 1024 ** 2, 1),
+    }
+
+
+def measure_queries(directory, questions, token_delay):
+    """Runs in a fresh process: questions against the index in directory, answered by a stub LLM."""
+    os.chdir(directory)
+    redirect_output("query.log")
+    from langchain_core.language_models.fake import FakeStreamingListLLM
+    import query_interface
+    from query_cache import QueryCache
+    # The stub streams STUB_ANSWER one character at a time, token_delay seconds apart,
+    # and the cache keeps nothing, so every question runs retrieval and the prompt stage
+    query_interface._llm = FakeStreamingListLLM(responses=[STUB_ANSWER], sleep=token_delay or None)
+    query_interface.query_cache = QueryCache(max_entries=0)
+
+    # The first question pays for loading the embedding model and the index
+    start = time.time()
+    query_interface.query_bugzilla(questions[0])
+    cold = time.time() - start
+    latencies = []
+    for question in questions[1:]:
+        start = time.time()
+        query_interface.query_bugzilla(question)
+        latencies.append(time.time() - start)
+    return {
+        "questions": len(questions),
+        "cold_seconds": round(cold, 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None,
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 1) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def sample_questions(corpus, count, seed=0):
+    # Questions in the words of randomly picked bugs, like a user describing a problem
+    bugs = [(bug.get("title", ""), bug.get("Product", ""), bug.get("Component", "")) for bug in iter_bugs(corpus)]
+    picked = random.Random(seed).sample(bugs, min(count, len(bugs)))
+    return [f"How was the {component} problem '{title.lower()}' in {product} fixed?" for title, product, component in picked]
+
+
+def in_subprocess(function, *args):
+    # Every stage gets a fresh process, so its memory and cold start are its own
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def fresh_directory(path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    return os.path.abspath(path)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_download(directory, corpus, max_in_flight, mock_options):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    server = context.Process(target=serve_mock, args=(corpus, 0, ready), kwargs=mock_options, daemon=True)
+    server.start()
+    try:
+        port = ready.get(timeout=600)
+        keys = [f"benchmark-{i}" for i in range(BENCH_KEYS)]
+        result = in_subprocess(
+            measure_download, fresh_directory(os.path.join(directory, "download")),
+            f"http://127.0.0.1:{port}/rest/bug", keys, BENCH_KEY_RATE, max_in_flight,
+        )
+        with urlopen(f"http://127.0.0.1:{port}/__stats") as response:
+            result["server"] = json.load(response)
+    finally:
+        server.terminate()
+        server.join()
+    return result
+
+
+def run_benchmarks(directory=BENCH_DIR, stages=STAGES, corpus=None, corpus_options=None, mock_options=None,
+                   max_in_flight=8, queries=QUERY_COUNT, token_delay=0.0):
+    """Runs the chosen stages and returns their results with the settings and environment.
+
+    Without corpus, a synthetic one is generated from corpus_options. The download stage
+    exports it from the mock Bugzilla, the index stage indexes it into a fresh chroma_db,
+    and the query stage asks questions about it against that index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus_options = corpus_options or {}
+    mock_options = mock_options or {}
+    results = {
+        "started": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "environment": environment(),
+        "settings": {
+            "stages": list(stages), "corpus": corpus, "corpus_options": corpus_options, "mock_options": mock_options,
+            "max_in_flight": max_in_flight, "queries": queries, "token_delay": token_delay,
+        },
+    }
+    if corpus is None:
+        logging.info("Generating the synthetic corpus...")
+        start = time.time()
+        results["corpus"] = generate_corpus(os.path.join(directory, "corpus", "bug_reports.jsonl"), **corpus_options)
+        results["corpus"]["seconds"] = round(time.time() - start, 2)
+        corpus = results["corpus"]["path"]
+    corpus = os.path.abspath(corpus)
+
+    index_directory = os.path.join(directory, "index")
+    if "download" in stages:
+        logging.info("Benchmarking the download...")
+        results["download"] = run_download(directory, corpus, max_in_flight, mock_options)
+    if "index" in stages:
+        logging.info("Benchmarking the indexer...")
+        results["index"] = in_subprocess(measure_index, fresh_directory(index_directory), corpus)
+    if "query" in stages:
+        if not os.path.exists(os.path.join(index_directory, "chroma_db")):
+            raise ValueError(f"The query stage needs the index stage's output in '{index_directory}'")
+        logging.info("Benchmarking queries...")
+        results["query"] = in_subprocess(
+            measure_queries, os.path.abspath(index_directory), sample_questions(corpus, queries), token_delay
+        )
+    return results
+
+
+def compare(old, new):
+    """Change of the headline numbers from result file old to new; positive is better."""
+    rows = []
+    for stage, metric, higher_is_better in COMPARED:
+        before, after = old.get(stage, {}).get(metric), new.get(stage, {}).get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append({
+            "metric": f"{stage}.{metric}",
+            "old": before,
+            "new": after,
+            "improvement_percent": round(change if higher_is_better else -change, 1) or 0.0,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the download, index and query pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="write a synthetic bug_reports.jsonl (or .json)")
+    generate_parser.add_argument('output', nargs='?', default="bug_reports.jsonl")
+    serve_parser = commands.add_parser("serve", help="serve a bug file as a mock Bugzilla REST API")
+    serve_parser.add_argument('corpus', nargs='?', default="bug_reports.jsonl")
+    serve_parser.add_argument('--port', type=int, default=8080)
+    run_parser = commands.add_parser("run", help="run the benchmarks and write their results as JSON")
+    run_parser.add_argument('--dir', default=BENCH_DIR, help=f"working directory (default: {BENCH_DIR})")
+    run_parser.add_argument('--output', default=RESULTS_FILE)
+    run_parser.add_argument('--stages', default=",".join(STAGES), help="comma-separated subset of download,index,query")
+    run_parser.add_argument('--corpus', help="use this bug file instead of a synthetic corpus")
+    run_parser.add_argument('--max-in-flight', type=int, default=8)
+    run_parser.add_argument('--queries', type=int, default=QUERY_COUNT)
+    run_parser.add_argument('--token-delay', type=float, default=0.0, help="seconds between the stub LLM's tokens")
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    for sub in (generate_parser, run_parser):
+        sub.add_argument('--bugs', type=int, default=CORPUS_BUGS)
+        sub.add_argument('--comments-per-bug', type=float, default=COMMENTS_PER_BUG)
+        sub.add_argument('--comment-chars', type=int, default=COMMENT_CHARS, help="median comment length")
+        sub.add_argument('--comment-sigma', type=float, default=COMMENT_SIGMA, help="spread of the log-normal comment length")
+        sub.add_argument('--stack-trace-rate', type=float, default=STACK_TRACE_RATE)
+        sub.add_argument('--seed', type=int, default=0)
+    for sub in (serve_parser, run_parser):
+        sub.add_argument('--latency-ms', type=float, default=MOCK_LATENCY_MS)
+        sub.add_argument('--jitter-ms', type=float, default=MOCK_JITTER_MS)
+        sub.add_argument('--rate-429', type=float, default=0.0, help="share of requests answered with 429")
+        sub.add_argument('--rate-503', type=float, default=0.0, help="share of requests answered with 503")
+        sub.add_argument('--retry-after', type=float, default=MOCK_RETRY_AFTER)
+        sub.add_argument('--bandwidth-mbps', type=float, default=MOCK_BANDWIDTH_MBPS, help="0 for unlimited")
+        sub.add_argument('--path-id-only', action='store_true',
+                         help="answer comment requests only for the bug in the path, ignoring ?ids=")
+    args = parser.parse_args()
+
+    if args.command in ("generate", "run"):
+        corpus_options = {
+            "bugs": args.bugs, "comments_per_bug": args.comments_per_bug, "comment_chars": args.comment_chars,
+            "comment_sigma": args.comment_sigma, "stack_trace_rate": args.stack_trace_rate, "seed": args.seed,
+        }
+    if args.command in ("serve", "run"):
+        mock_options = {
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "rate_429": args.rate_429,
+            "rate_503": args.rate_503, "retry_after": args.retry_after, "bandwidth_mbps": args.bandwidth_mbps,
+            "path_id_only": args.path_id_only,
+        }
+
+    if args.command == "generate":
+        print(json.dumps(generate_corpus(args.output, **corpus_options), indent=2))
+    elif args.command == "serve":
+        serve_mock(args.corpus, args.port, **mock_options)
+    elif args.command == "run":
+        stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+        results = run_benchmarks(
+            args.dir, stages, args.corpus, None if args.corpus else corpus_options, mock_options,
+            max(1, args.max_in_flight), args.queries, args.token_delay,
+        )
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(json.dumps({stage: results[stage] for stage in stages}, indent=2))
+        logging.info(f"Results written to {args.output}")
+    else:
+        with open(args.old) as old, open(args.new) as new:
+            print(json.dumps(compare(json.load(old), json.load(new)), indent=2))
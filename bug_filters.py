@@ -0,0 +1,195 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+# Bug fields stored as metadata on every chunk and in the lexical index; "reported"
+# holds the creation time in seconds since the epoch
+FILTER_FIELDS = ["product", "component", "version", "status"]
+SOURCE_FIELDS = {"product": "Product", "component": "Component", "version": "version", "status": "Status"}
+
+OPEN_STATUSES = ["UNCONFIRMED", "NEW", "CONFIRMED", "ASSIGNED", "IN_PROGRESS", "REOPENED"]
+CLOSED_STATUSES = ["RESOLVED", "VERIFIED", "CLOSED"]
+STATUS_WORDS = {
+    "open": OPEN_STATUSES, "unresolved": OPEN_STATUSES, "active": OPEN_STATUSES,
+    "closed": CLOSED_STATUSES, "resolved": CLOSED_STATUSES, "fixed": CLOSED_STATUSES,
+}
+# Short product names people use in questions; a version after them narrows the match
+PRODUCT_ALIASES = {
+    "sles": "SUSE Linux Enterprise Server",
+    "sled": "SUSE Linux Enterprise Desktop",
+    "sle": "SUSE Linux Enterprise",
+    "leap": "openSUSE Leap",
+    "tumbleweed": "openSUSE Tumbleweed",
+    "suma": "SUSE Manager",
+}
+
+# Status words only count when they describe bugs ("open kernel bugs", "resolved issues")
+STATUS_PATTERN = re.compile(
+    r"\b(" + "|".join(STATUS_WORDS) + r")\b(?:\s+[\w.-]+){0,3}?\s+(?:bugs?|issues?|reports?)\b", re.IGNORECASE
+)
+ALIAS_PATTERN = re.compile(
+    r"\b(" + "|".join(PRODUCT_ALIASES) + r")\b(?:[\s-]*(\d+(?:\.\d+)?))?(?:[\s-]*sp\s*(\d+))?", re.IGNORECASE
+)
+DATE = r"(\d{4}(?:-\d{2}(?:-\d{2})?)?)"
+AFTER_PATTERN = re.compile(r"\b(since|from|after)\s+" + DATE + r"\b", re.IGNORECASE)
+BEFORE_PATTERN = re.compile(r"\b(?:before|until)\s+" + DATE + r"\b", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(?:in|during)\s+(\d{4})\b", re.IGNORECASE)
+RECENT_PATTERN = re.compile(r"\b(?:last|past)\s+(\d+)\s+(day|week|month|year)s?\b", re.IGNORECASE)
+RECENT_UNITS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+
+def parse_timestamp(value):
+    """Seconds since the epoch for an ISO 8601 date or time, None if it cannot be parsed."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not value:
+        return None
+    value = str(value).strip()
+    for fmt in ("%Y", "%Y-%m"):
+        try:
+            return int(datetime.strptime(value, fmt).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            pass
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def end_of_period(value):
+    # "after 2023" and "in 2023" refer to the whole year (month, day)
+    start = datetime.fromtimestamp(parse_timestamp(value), timezone.utc)
+    if len(value) == 4:
+        end = start.replace(year=start.year + 1)
+    elif len(value) == 7:
+        end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    else:
+        end = start + timedelta(days=1)
+    return int(end.timestamp())
+
+
+def bug_metadata(bug):
+    metadata = {}
+    for field, source in SOURCE_FIELDS.items():
+        value = bug.get(source)
+        if value not in (None, ""):
+            metadata[field] = str(value)
+    reported = parse_timestamp(bug.get("Reported"))
+    if reported is not None:
+        metadata["reported"] = reported
+    return metadata
+
+
+def normalize_filters(values):
+    """Filters from form fields or JSON.
+
+    Fields take a string (comma-separated) or a list; status also accepts "open" and
+    "closed". reported_after and reported_before are dates or timestamps. Empty values
+    are dropped.
+    """
+    filters = {}
+    for field in FILTER_FIELDS:
+        value = values.get(field)
+        if isinstance(value, str):
+            value = [part.strip() for part in value.split(",")]
+        value = [str(part) for part in value or [] if str(part).strip()]
+        if field == "status":
+            value = [status for part in value for status in STATUS_WORDS.get(part.lower(), [part.upper()])]
+        if value:
+            filters[field] = value
+    for bound in ("reported_after", "reported_before"):
+        timestamp = parse_timestamp(values.get(bound))
+        if timestamp is not None:
+            filters[bound] = timestamp
+    return filters
+
+
+def mentioned_values(question, values):
+    # Known values named in the question as whole words, longest first so they win over their prefixes
+    found = []
+    for value in sorted(values, key=len, reverse=True):
+        if re.search(r"(?<!\w)" + re.escape(value) + r"(?!\w)", question, re.IGNORECASE):
+            if not any(value.lower() in other.lower() for other in found):
+                found.append(value)
+    return found
+
+
+def parse_filters(question, facets):
+    """Filters implied by the question, e.g. "open kernel bugs in SLES 15 since 2023".
+
+    facets maps field names to the values known to exist; products and components are
+    only recognised among those. Status words and components must be followed by "bugs"
+    or similar, so a question merely mentioning "network" is not narrowed to the Network
+    component.
+    """
+    filters = {}
+
+    statuses = []
+    for word in STATUS_PATTERN.findall(question):
+        statuses.extend(status for status in STATUS_WORDS[word.lower()] if status not in statuses)
+    known = set(facets.get("status", []))
+    if statuses and known:
+        statuses = [status for status in statuses if status in known]
+    if statuses:
+        filters["status"] = statuses
+
+    products = mentioned_values(question, facets.get("product", []))
+    for alias, version, service_pack in ALIAS_PATTERN.findall(question):
+        prefix = PRODUCT_ALIASES[alias.lower()]
+        if version:
+            prefix += f" {version}"
+        if service_pack:
+            prefix += f" SP{service_pack}"
+        products.extend(
+            product for product in facets.get("product", [])
+            if re.match(re.escape(prefix) + r"(?!\w)", product, re.IGNORECASE) and product not in products
+        )
+    if products:
+        filters["product"] = products
+
+    components = [
+        component for component in facets.get("component", [])
+        if re.search(r"(?<!\w)" + re.escape(component) + r"\s+(?:bugs?|issues?|component|problems?)\b", question, re.IGNORECASE)
+    ]
+    if components:
+        filters["component"] = components
+
+    match = AFTER_PATTERN.search(question)
+    if match:
+        # "since 2023" includes 2023, "after 2023" starts with 2024
+        after = end_of_period if match.group(1).lower() == "after" else parse_timestamp
+        filters["reported_after"] = after(match.group(2))
+    match = BEFORE_PATTERN.search(question)
+    if match:
+        filters["reported_before"] = parse_timestamp(match.group(1))
+    match = YEAR_PATTERN.search(question)
+    if match and "reported_after" not in filters and "reported_before" not in filters:
+        filters["reported_after"] = parse_timestamp(match.group(1))
+        filters["reported_before"] = end_of_period(match.group(1))
+    match = RECENT_PATTERN.search(question)
+    if match and "reported_after" not in filters:
+        days = int(match.group(1)) * RECENT_UNITS[match.group(2).lower()]
+        filters["reported_after"] = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp())
+    return filters
+
+
+def filters_key(filters):
+    return tuple(sorted((field, tuple(value) if isinstance(value, list) else value) for field, value in filters.items()))
+
+
+def build_where(filters):
+    """Chroma where clause for the filters, None without filters."""
+    conditions = []
+    for field in FILTER_FIELDS:
+        values = filters.get(field)
+        if values:
+            conditions.append({field: {"$eq": values[0]}} if len(values) == 1 else {field: {"$in": values}})
+    if filters.get("reported_after") is not None:
+        conditions.append({"reported": {"$gte": filters["reported_after"]}})
+    if filters.get("reported_before") is not None:
+        conditions.append({"reported": {"$lt": filters["reported_before"]}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+import argparse
+import json
+import sqlite3
+import threading
+
+BUG_DB = "bug_reports.sqlite3"
+SQLITE_HEADER = b"SQLite format 3\0"
+
+# Keys of a bug record (as written by download_bugzilla.make_bug_record) and their columns;
+# any other keys are kept as JSON in the extra column
+COLUMNS = {"title": "title", "Product": "product", "version": "version", "Component": "component", "Reported": "reported", "Status": "status"}
+COMMENT_COLUMNS = ("name", "date", "text")
+SCAN_BATCH = 1000
+
+
+class BugStore:
+    """Bug records in SQLite: one row per bug keyed by bug_number, comments in a child table.
+
+    Records go in and come out in the downloader's format. Appending a bug_number that is
+    already stored replaces the bug and its comments. Reads can be limited to some fields;
+    the comments table is only read when "Comments" is one of them.
+
+    Like JsonlStore it has append(), commit(), close() and count, so the downloader can
+    write to it directly; writes are committed every commit_every bugs.
+    """
+
+    def __init__(self, path=BUG_DB, commit_every=500):
+        self.path = path
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS bugs (
+                    bug_number INTEGER PRIMARY KEY,
+                    {", ".join(f"{column} TEXT" for column in COLUMNS.values())},
+                    extra TEXT
+                );
+                CREATE TABLE IF NOT EXISTS comments (
+                    bug_number INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    {", ".join(f"{column} TEXT" for column in COMMENT_COLUMNS)},
+                    extra TEXT,
+                    PRIMARY KEY (bug_number, position)
+                ) WITHOUT ROWID;
+            """)
+        self.count = self.conn.execute("SELECT COUNT(*) FROM bugs").fetchone()[0]
+        self.pending = 0
+
+    @staticmethod
+    def _extra(item, known):
+        extra = {key: value for key, value in item.items() if key not in known}
+        return json.dumps(extra, ensure_ascii=False) if extra else None
+
+    def append(self, record):
+        bug_number = int(record["bug_number"])
+        comments = record.get("Comments") or []
+        row = (
+            bug_number, *(record.get(key) for key in COLUMNS),
+            self._extra(record, {"bug_number", "Comments", *COLUMNS}),
+        )
+        with self.lock:
+            exists = self.conn.execute("SELECT 1 FROM bugs WHERE bug_number = ?", (bug_number,)).fetchone()
+            self.conn.execute(f"INSERT OR REPLACE INTO bugs VALUES ({', '.join('?' * len(row))})", row)
+            self.conn.execute("DELETE FROM comments WHERE bug_number = ?", (bug_number,))
+            self.conn.executemany(
+                f"INSERT INTO comments VALUES ({', '.join('?' * (3 + len(COMMENT_COLUMNS)))})",
+                (
+                    (bug_number, i, *(comment.get(key) for key in COMMENT_COLUMNS), self._extra(comment, COMMENT_COLUMNS))
+                    for i, comment in enumerate(comments)
+                ),
+            )
+            self.count += not exists
+            self.pending += 1
+            if self.pending >= self.commit_every:
+                self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def commit(self):
+        with self.lock:
+            self._commit()
+
+    def delete(self, bug_numbers):
+        with self.lock:
+            for bug_number in bug_numbers:
+                removed = self.conn.execute("DELETE FROM bugs WHERE bug_number = ?", (int(bug_number),)).rowcount
+                self.conn.execute("DELETE FROM comments WHERE bug_number = ?", (int(bug_number),))
+                self.count -= removed
+            self._commit()
+
+    def _records(self, where, params, fields):
+        # Runs the bug query and, if asked for, one comments query for all of its bugs
+        fields = None if fields is None else set(fields)
+        keys = [key for key in COLUMNS if fields is None or key in fields]
+        with_extra = fields is None or bool(fields - {"bug_number", "Comments", *COLUMNS})
+        columns = ["bug_number", *(COLUMNS[key] for key in keys)] + (["extra"] if with_extra else [])
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(columns)} FROM bugs WHERE {where} ORDER BY bug_number", params).fetchall()
+            comments = {}
+            if rows and (fields is None or "Comments" in fields):
+                for row in self.conn.execute(
+                    f"SELECT bug_number, {', '.join(COMMENT_COLUMNS)}, extra FROM comments "
+                    f"WHERE bug_number IN (SELECT bug_number FROM bugs WHERE {where}) ORDER BY bug_number, position",
+                    params,
+                ):
+                    comment = dict(zip(COMMENT_COLUMNS, row[1:-1]))
+                    if row[-1]:
+                        comment.update(json.loads(row[-1]))
+                    comments.setdefault(row[0], []).append(comment)
+
+        records = {}
+        for row in rows:
+            record = {"bug_number": row[0], **dict(zip(keys, row[1:]))}
+            if fields is None or "Comments" in fields:
+                record["Comments"] = comments.get(row[0], [])
+            if with_extra and row[-1]:
+                extra = json.loads(row[-1])
+                record.update(extra if fields is None else {key: value for key, value in extra.items() if key in fields})
+            records[row[0]] = record
+        return records
+
+    def get(self, bug_number, fields=None):
+        """The record of one bug, or None. fields limits it to those keys (bug_number is always included)."""
+        return self._records("bug_number = ?", (int(bug_number),), fields).get(int(bug_number))
+
+    def get_many(self, bug_numbers, fields=None):
+        """Records of the bugs that exist, in the order asked for."""
+        bug_numbers = [int(number) for number in bug_numbers]
+        found = {}
+        for i in range(0, len(bug_numbers), 500):
+            part = bug_numbers[i:i + 500]
+            found.update(self._records(f"bug_number IN ({','.join('?' * len(part))})", part, fields))
+        return [found[number] for number in bug_numbers if number in found]
+
+    def scan(self, fields=None, batch_size=SCAN_BATCH):
+        """Yields every record in bug_number order, reading batch_size bugs at a time.
+
+        Each batch is its own query, so writers are not blocked for the whole scan and
+        only one batch is held in memory.
+        """
+        last = None
+        while True:
+            where, params = ("bug_number > ?", (last,)) if last is not None else ("1", ())
+            with self.lock:
+                numbers = [row[0] for row in self.conn.execute(
+                    f"SELECT bug_number FROM bugs WHERE {where} ORDER BY bug_number LIMIT ?", (*params, batch_size)
+                )]
+            if not numbers:
+                return
+            records = self._records("bug_number BETWEEN ? AND ?", (numbers[0], numbers[-1]), fields)
+            yield from records.values()
+            last = numbers[-1]
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.commit()
+                self.conn.close()
+                self.conn = None
+
+
+def is_bug_store(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+def iter_store(path, fields=None):
+    store = BugStore(path)
+    try:
+        yield from store.scan(fields)
+    finally:
+        store.close()
+
+
+def import_records(src, dst=BUG_DB):
+    """Copies the bugs of a JSON Lines file or legacy JSON array into a BugStore; returns its bug count.
+
+    Records without a usable bug_number (missing or empty in some old exports) are skipped.
+    """
+    from jsonl_store import iter_bugs
+    store = BugStore(dst)
+    skipped = 0
+    try:
+        for record in iter_bugs(src):
+            try:
+                int(record["bug_number"])
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            store.append(record)
+    finally:
+        store.close()
+    if skipped:
+        print(f"Skipped {skipped} records without a valid bug_number in '{src}'.")
+    return store.count
+
+
+def export_records(src, dst):
+    """Writes every bug of a BugStore to a JSON Lines file, in bug_number order."""
+    from jsonl_store import JsonlStore
+    out = JsonlStore(dst)
+    try:
+        for record in iter_store(src):
+            out.append(record)
+    finally:
+        out.close()
+    return out.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bug records in an indexed SQLite store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="add the bugs of a JSON Lines or JSON array file")
+    import_parser.add_argument("src")
+    export_parser = commands.add_parser("export", help="write all bugs to a JSON Lines file")
+    export_parser.add_argument("dst")
+    get_parser = commands.add_parser("get", help="print bugs by number")
+    get_parser.add_argument("bug_numbers", nargs="+", type=int)
+    get_parser.add_argument("--fields", help="comma-separated record keys, e.g. title,Status,Comments")
+    for sub in (import_parser, export_parser, get_parser):
+        sub.add_argument("--db", default=BUG_DB)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        print(f"'{args.db}' now holds {import_records(args.src, args.db)} bugs.")
+    elif args.command == "export":
+        print(f"Wrote {export_records(args.db, args.dst)} bugs to '{args.dst}'.")
+    else:
+        store = BugStore(args.db)
+        fields = args.fields.split(",") if args.fields else None
+        for record in store.get_many(args.bug_numbers, fields):
+            print(json.dumps(record, ensure_ascii=False, indent=2))
+        store.close()
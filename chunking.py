@@ -0,0 +1,79 @@
+# all-MiniLM-L6-v2 truncates input after 256 word pieces, including [CLS] and [SEP]
+CHUNK_TOKENS = 256
+SPECIAL_TOKENS = 2
+
+
+def load_tokenizer(model_name):
+    # transformers takes seconds to import, so only pay for it where chunks are built
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+def token_counts(tokenizer, texts):
+    if not texts:
+        return []
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]]
+
+
+def split_long_line(tokenizer, line, budget):
+    # Cuts a line that is longer than the budget at token boundaries, keeping the original text
+    offsets = tokenizer(line, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    pieces = []
+    for start in range(0, len(offsets), budget):
+        window = offsets[start:start + budget]
+        end = offsets[start + budget][0] if start + budget < len(offsets) else len(line)
+        pieces.append(line[window[0][0]:end].strip())
+    return [piece for piece in pieces if piece]
+
+
+def chunk_text(tokenizer, header, lines, max_tokens=CHUNK_TOKENS):
+    """Packs lines into chunks that each start with the header and fit max_tokens.
+
+    Returns (text, token_count) pairs; the counts are used for length-sorted batching.
+    """
+    header = header.rstrip("\n")
+    header_tokens = token_counts(tokenizer, [header])[0]
+    budget = max(16, max_tokens - SPECIAL_TOKENS - header_tokens)
+
+    pieces = []
+    for line, count in zip(lines, token_counts(tokenizer, lines)):
+        if count <= budget:
+            pieces.append((line, count))
+        else:
+            split = split_long_line(tokenizer, line, budget)
+            pieces.extend(zip(split, token_counts(tokenizer, split)))
+
+    chunks = []
+    current, current_tokens = [], header_tokens
+    for piece, count in pieces:
+        # One token of slack per line keeps the joined chunk safely inside the budget
+        if current and current_tokens + count + 1 > header_tokens + budget:
+            chunks.append(("\n".join([header] + current), current_tokens))
+            current, current_tokens = [], header_tokens
+        current.append(piece)
+        current_tokens += count + 1
+    if current or not chunks:
+        chunks.append(("\n".join([header] + current), current_tokens))
+    return chunks
+
+
+def length_sorted_batches(lengths, batch_size):
+    # Batches of indices with similar token counts, so padding inside a batch stays small
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+def collapse_chunks(documents, k):
+    # Keeps the best-ranked chunk of each bug, in rank order, until k bugs are found
+    seen = set()
+    collapsed = []
+    for doc in documents:
+        bug_id = doc.metadata.get("bug_id") if doc.metadata else None
+        if bug_id in seen:
+            continue
+        seen.add(bug_id)
+        collapsed.append(doc)
+        if len(collapsed) == k:
+            break
+    return collapsed
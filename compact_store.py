@@ -0,0 +1,519 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from bug_filters import FILTER_FIELDS
+
+CHROMA_DIR = "chroma_db"
+COLLECTION_NAME = "langchain"  # written by index_bugs_to_chroma.py
+COMPACT_DIR = "compact_store"
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+DTYPES = {"int8": np.int8, "float16": np.float16}
+DEFAULT_DTYPE = "int8"
+EXPORT_PAGE = 5000  # rows per collection.get while exporting
+BLOCK_ROWS = 4096  # rows converted to float32 at once while scanning
+# IVF: vectors are grouped into nlist k-means lists stored contiguously; a query scans
+# the nprobe lists whose centroids are closest. nlist=0 means brute force.
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+# With a filter matching at most this many rows, those rows are scanned exactly
+EXACT_SEARCH_ROWS = 50000
+MISSING = np.iinfo(np.int64).min  # reported and bug_id of chunks without them
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize(vectors, dtype):
+    # int8 keeps one float32 scale per vector: v ~ q * scale
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def top_k(scores, rows, k):
+    # The k highest scores of every column (one column per query), unordered
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1, axis=0)[:k]
+        scores, rows = np.take_along_axis(scores, part, 0), np.take_along_axis(rows, part, 0)
+    return scores, rows
+
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def train_centroids(vectors, nlist, seed=0):
+    """Spherical k-means on a sample of the (normalized) vectors."""
+    rng = np.random.default_rng(seed)
+    count = len(vectors)
+    sample = np.sort(rng.choice(count, min(count, nlist * KMEANS_SAMPLE_PER_LIST), replace=False))
+    data = np.asarray(vectors[sample])
+    centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        # Lists that lost all their vectors restart from a random one
+        empty = np.bincount(assignment, minlength=nlist) == 0
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign_lists(vectors, centroids):
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        assignment[start:start + BLOCK_ROWS] = np.argmax(np.asarray(vectors[start:start + BLOCK_ROWS]) @ centroids.T, axis=1)
+    return assignment
+
+
+def export_collection(collection, directory=COMPACT_DIR, dtype=DEFAULT_DTYPE, nlist=0):
+    """Writes the collection's vectors, documents and metadata as a compact store.
+
+    The store is built next to directory and swapped in at the end, so a reader never
+    sees half a store. Returns the number of rows exported.
+    """
+    tmp_dir = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    start_time = time.time()
+
+    # Pass 1: normalized float32 vectors into a scratch file, documents into their final file
+    total = collection.count()
+    raw, dim = None, None
+    ids, spans = [], []
+    columns = {"bug_id": [], "reported": [], **{field: [] for field in FILTER_FIELDS}}
+    with open(os.path.join(tmp_dir, "documents.jsonl"), "wb") as documents:
+        for offset in range(0, total, EXPORT_PAGE):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=EXPORT_PAGE, offset=offset)
+            if not page["ids"]:
+                break
+            vectors = normalize(page["embeddings"])
+            if raw is None:
+                dim = vectors.shape[1]
+                raw = np.lib.format.open_memmap(os.path.join(tmp_dir, "raw.npy"), mode="w+", dtype=np.float32, shape=(total, dim))
+            raw[len(ids):len(ids) + len(vectors)] = vectors
+            for doc_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                metadata = metadata or {}
+                line = json.dumps([text, metadata], ensure_ascii=False).encode("utf-8") + b"\n"
+                spans.append((documents.tell(), len(line)))
+                documents.write(line)
+                ids.append(doc_id)
+                columns["bug_id"].append(as_int(metadata.get("bug_id")))
+                columns["reported"].append(as_int(metadata.get("reported")))
+                for field in FILTER_FIELDS:
+                    columns[field].append(metadata.get(field))
+            logging.info(f"Read {len(ids)}/{total} vectors from Chroma.")
+    count = len(ids)
+    if raw is None:
+        raise ValueError("The collection is empty; run index_bugs_to_chroma.py first.")
+
+    # Pass 2: optionally group the rows by IVF list, then write every array in that order
+    manifest = {"count": count, "dim": dim, "dtype": dtype, "nlist": 0, "created": time.time(), "vocab": {}}
+    order = np.arange(count)
+    if nlist:
+        nlist = min(nlist, count)
+        centroids = train_centroids(raw[:count], nlist)
+        assignment = assign_lists(raw[:count], centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp_dir, "list_offsets.npy"), offsets.astype(np.int64))
+        manifest["nlist"] = nlist
+
+    stored = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=DTYPES[dtype], shape=(count, dim))
+    scales = np.empty(count, dtype=np.float32)
+    for start in range(0, count, BLOCK_ROWS):
+        rows = order[start:start + BLOCK_ROWS]
+        stored[start:start + len(rows)], block_scales = quantize(raw[rows], dtype)
+        if block_scales is not None:
+            scales[start:start + len(rows)] = block_scales
+    stored.flush()
+    del stored, raw
+    os.remove(os.path.join(tmp_dir, "raw.npy"))
+    if dtype == "int8":
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+
+    np.save(os.path.join(tmp_dir, "ids.npy"), np.array(ids)[order])
+    np.save(os.path.join(tmp_dir, "spans.npy"), np.array(spans, dtype=np.int64)[order])
+    np.save(os.path.join(tmp_dir, "bug_id.npy"), np.array(columns["bug_id"], dtype=np.int64)[order])
+    np.save(os.path.join(tmp_dir, "reported.npy"), np.array(columns["reported"], dtype=np.int64)[order])
+    for field in FILTER_FIELDS:
+        # Text fields become codes into a sorted vocabulary, -1 where missing
+        vocab = sorted({str(value) for value in columns[field] if value is not None})
+        codes = {value: i for i, value in enumerate(vocab)}
+        values = np.array([codes[str(value)] if value is not None else -1 for value in columns[field]], dtype=np.int32)
+        np.save(os.path.join(tmp_dir, f"{field}.npy"), values[order])
+        manifest["vocab"][field] = vocab
+
+    # The manifest is written last; its presence marks a complete store
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    old_dir = directory.rstrip("/") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_dir)
+    os.rename(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logging.info(
+        f"Exported {count} vectors as {dtype}{f' in {nlist} IVF lists' if nlist else ''} to {directory} "
+        f"({directory_size(directory) / 1024 ** 2:.1f} MB) in {time.time() - start_time:.1f} seconds."
+    )
+    return count
+
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+    )
+
+
+class CompactStore:
+    """Read-only, memory-mapped vectors written by export_collection().
+
+    Vectors are int8 (with a scale per row) or float16 and are scored by cosine
+    similarity, which for the normalized embeddings ranks like Chroma's L2 distance.
+    Only the pages a query touches are read, so opening the store is instant. Filters
+    are Chroma where clauses over bug_id, reported and the bug_filters fields.
+    """
+
+    def __init__(self, directory=COMPACT_DIR, nprobe=DEFAULT_NPROBE):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        with open(self.manifest_path) as f:
+            self.manifest = json.load(f)
+        self.mtime = os.stat(self.manifest_path).st_mtime_ns
+        self.count = self.manifest["count"]
+        self.nlist = self.manifest["nlist"]
+
+        def load(name):
+            path = os.path.join(directory, f"{name}.npy")
+            return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+        self.vectors = load("vectors")
+        self.scales = load("scales")
+        self.ids = load("ids")
+        self.spans = load("spans")
+        self.centroids = load("centroids")
+        self.list_offsets = load("list_offsets")
+        self.columns = {name: load(name) for name in ["bug_id", "reported", *FILTER_FIELDS]}
+        self.codes = {field: {value: i for i, value in enumerate(vocab)} for field, vocab in self.manifest["vocab"].items()}
+        self.documents = open(os.path.join(directory, "documents.jsonl"), "rb")
+
+    def stale(self):
+        # True once the store has been exported again
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns != self.mtime
+        except OSError:
+            return True
+
+    def close(self):
+        # The memmaps are unmapped with the store once nothing refers to it any more, so a
+        # search still running on it is not cut off
+        self.documents.close()
+
+    def _column_values(self, field, values):
+        # Where-clause values as they are stored in the column
+        if field in self.codes:
+            return [self.codes[field][str(value)] for value in values if str(value) in self.codes[field]]
+        if field in ("bug_id", "reported"):
+            return [as_int(value) for value in values]
+        raise ValueError(f"Cannot filter on {field!r}; the store has {sorted(self.columns)}")
+
+    def mask(self, where):
+        """Boolean row mask for a Chroma where clause."""
+        if "$and" in where or "$or" in where:
+            combine = np.logical_and if "$and" in where else np.logical_or
+            masks = [self.mask(clause) for clause in where.get("$and", where.get("$or"))]
+            result = masks[0]
+            for other in masks[1:]:
+                result = combine(result, other)
+            return result
+        result = np.ones(self.count, dtype=bool)
+        for field, condition in where.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            column = self.columns.get(field)
+            if column is None:
+                raise ValueError(f"Cannot filter on {field!r}; the store has {sorted(self.columns)}")
+            missing = MISSING if field in ("bug_id", "reported") else -1
+            for op, value in condition.items():
+                if op in ("$eq", "$ne", "$in", "$nin"):
+                    values = self._column_values(field, value if op in ("$in", "$nin") else [value])
+                    matches = np.isin(column, values)
+                    result &= ~matches & (column != missing) if op in ("$ne", "$nin") else matches
+                elif op in ("$gt", "$gte", "$lt", "$lte") and field in ("bug_id", "reported"):
+                    compare = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}[op]
+                    result &= compare(column, as_int(value)) & (column != missing)
+                else:
+                    raise ValueError(f"Unsupported condition {op} on {field!r}")
+        return result
+
+    def _scores(self, rows, queries):
+        # rows is a slice or an array of row numbers; one column of scores per query
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ queries.T
+        if self.scales is not None:
+            scores *= self.scales[rows][:, None]
+        return scores
+
+    def _blocks(self, ranges, mask=None):
+        # Contiguous rows are read as slices, which a memmap serves without copying
+        for range_start, range_stop in ranges:
+            for start in range(range_start, range_stop, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, range_stop)
+                yield slice(start, stop) if mask is None else start + np.flatnonzero(mask[start:stop])
+
+    def _scan(self, blocks, queries, k):
+        """Returns (scores, rows), each of shape (queries, <=k), best first."""
+        best_scores = np.empty((0, len(queries)), dtype=np.float32)
+        best_rows = np.empty((0, len(queries)), dtype=np.int64)
+        for rows in blocks:
+            numbers = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+            if not len(numbers):
+                continue
+            scores = self._scores(rows, queries)
+            numbers = np.broadcast_to(numbers[:, None], scores.shape)
+            best_scores, best_rows = top_k(np.concatenate([best_scores, scores]), np.concatenate([best_rows, numbers]), k)
+        order = np.argsort(-best_scores, axis=0, kind="stable")
+        return np.take_along_axis(best_scores, order, 0).T, np.take_along_axis(best_rows, order, 0).T
+
+    def _probe(self, query, nprobe):
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        return [(int(self.list_offsets[i]), int(self.list_offsets[i + 1])) for i in np.sort(lists)]
+
+    def search(self, vector, k=4, where=None, nprobe=None):
+        """Returns (scores, rows) of the k rows most similar to vector, best first."""
+        scores, rows = self.search_many([vector], k, where, nprobe)
+        found = rows[0] >= 0
+        return scores[0][found], rows[0][found]
+
+    def search_many(self, vectors, k=4, where=None, nprobe=None):
+        """Searches for several vectors at once; returns (scores, rows) with one row per vector.
+
+        Without IVF (or with a narrow filter) every block of the store is read once and
+        scored against all queries with a single matrix product. With IVF every query keeps
+        its own results; where a query found fewer than the others its row is padded with
+        row -1 and score -inf.
+        """
+        queries = normalize(np.atleast_2d(vectors))
+        mask = self.mask(where) if where else None
+        if mask is not None and (not self.nlist or mask.sum() <= EXACT_SEARCH_ROWS):
+            candidates = np.flatnonzero(mask)
+            blocks = (candidates[start:start + BLOCK_ROWS] for start in range(0, len(candidates), BLOCK_ROWS))
+            return self._scan(blocks, queries, k)
+        if not self.nlist:
+            return self._scan(self._blocks([(0, self.count)], mask), queries, k)
+
+        # Every query probes its own lists
+        results = []
+        for query in queries:
+            scores, rows = self._scan(self._blocks(self._probe(query, nprobe or self.nprobe), mask), query[None], k)
+            if rows.shape[1] < k:
+                # The probed lists held too few rows passing the filter
+                scores, rows = self._scan(self._blocks([(0, self.count)], mask), query[None], k)
+            results.append((scores[0], rows[0]))
+        width = max(len(rows) for _, rows in results)
+        padded_scores = np.full((len(results), width), -np.inf, dtype=np.float32)
+        padded_rows = np.full((len(results), width), -1, dtype=np.int64)
+        for i, (scores, rows) in enumerate(results):
+            padded_scores[i, :len(scores)] = scores
+            padded_rows[i, :len(rows)] = rows
+        return padded_scores, padded_rows
+
+    def document(self, row):
+        offset, length = self.spans[row]
+        text, metadata = json.loads(os.pread(self.documents.fileno(), int(length), int(offset)))
+        return text, metadata
+
+    def get(self, where=None, include=("documents", "metadatas")):
+        """Rows matching where, in the shape of Chroma's collection.get()."""
+        rows = np.flatnonzero(self.mask(where)) if where else np.arange(self.count)
+        result = {"ids": [str(self.ids[row]) for row in rows]}
+        documents = [self.document(row) for row in rows] if "documents" in include or "metadatas" in include else []
+        if "documents" in include:
+            result["documents"] = [text for text, _ in documents]
+        if "metadatas" in include:
+            result["metadatas"] = [metadata for _, metadata in documents]
+        return result
+
+
+class CompactVectorStore(VectorStore):
+    """LangChain view of a CompactStore; a read-only drop-in for the Chroma vector store."""
+
+    def __init__(self, directory=COMPACT_DIR, embedding_function=None, nprobe=DEFAULT_NPROBE):
+        self.store = CompactStore(directory, nprobe)
+        self.embedding_function = embedding_function
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("The compact store is read-only; re-export it with compact_store.py export")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Compact stores are built with compact_store.py export")
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] to a relevance score in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    def _documents(self, scores, rows):
+        results = []
+        for score, row in zip(scores, rows):
+            if row < 0:
+                continue  # padding of search_many()
+            text, metadata = self.store.document(row)
+            results.append((Document(id=str(self.store.ids[row]), page_content=text, metadata=metadata), float(score)))
+        return results
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self._documents(*self.store.search(embedding, k, filter, kwargs.get("nprobe")))
+
+    def similarity_search_by_vectors(self, embeddings, k=4, filter=None, **kwargs):
+        """Documents for every embedding, found in one pass over the store."""
+        scores, rows = self.store.search_many(embeddings, k, filter, kwargs.get("nprobe"))
+        return [[doc for doc, _ in self._documents(*pair)] for pair in zip(scores, rows)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def get(self, where=None, include=("documents", "metadatas")):
+        return self.store.get(where, include)
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(backend, directory, queries, k, nprobe):
+    """Runs in a fresh process: cold load, per-query latency and memory of one backend."""
+    rss_before = rss_bytes()
+    start = time.time()
+    if backend == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=directory).get_collection(COLLECTION_NAME)
+
+        def search(vector):
+            return collection.query(query_embeddings=[vector.tolist()], n_results=k, include=[])["ids"][0]
+    else:
+        store = CompactStore(directory, nprobe)
+
+        def search(vector):
+            _, rows = store.search(vector, k)
+            return [str(store.ids[row]) for row in rows]
+
+    # The first query pays for loading the index (Chroma's HNSW graph, the compact store's pages)
+    found = [search(queries[0])]
+    cold_load = time.time() - start
+    latencies = []
+    for vector in queries[1:]:
+        query_start = time.time()
+        found.append(search(vector))
+        latencies.append(time.time() - query_start)
+    return {
+        "cold_load_seconds": round(cold_load, 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2) if latencies else None,
+        "rss_mb": round((rss_bytes() - rss_before) / 1024 ** 2, 1),
+        "disk_mb": round(directory_size(directory) / 1024 ** 2, 1),
+        "found": found,
+    }
+
+
+def exact_neighbours(collection, queries, k):
+    # Ground truth: exact cosine search over Chroma's float32 vectors, streamed page by page
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=object)
+    for offset in range(0, collection.count(), EXPORT_PAGE):
+        page = collection.get(include=["embeddings"], limit=EXPORT_PAGE, offset=offset)
+        if not page["ids"]:
+            break
+        scores = np.concatenate([best_scores, queries @ normalize(page["embeddings"]).T], axis=1)
+        ids = np.concatenate([best_ids, np.tile(np.array(page["ids"], dtype=object), (len(queries), 1))], axis=1)
+        keep = np.argsort(-scores, axis=1)[:, :k]
+        best_scores, best_ids = np.take_along_axis(scores, keep, 1), np.take_along_axis(ids, keep, 1)
+    return [list(row) for row in best_ids]
+
+
+def sample_queries(collection, count, questions_file=None, seed=0):
+    if questions_file:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        with open(questions_file) as f:
+            questions = [line.strip() for line in f if line.strip()][:count]
+        return normalize(HuggingFaceEmbeddings(model_name=EMBED_MODEL).embed_documents(questions))
+    # Without questions, stored chunks act as queries
+    rng = np.random.default_rng(seed)
+    offsets = rng.choice(collection.count(), min(count, collection.count()), replace=False)
+    return normalize([collection.get(include=["embeddings"], limit=1, offset=int(offset))["embeddings"][0] for offset in offsets])
+
+
+def compare(chroma_dir, store_dir, queries=200, k=10, nprobe=DEFAULT_NPROBE, questions_file=None):
+    """Recall@k against exact search, latency, cold load and memory of Chroma and the compact store."""
+    import chromadb
+    collection = chromadb.PersistentClient(path=chroma_dir).get_collection(COLLECTION_NAME)
+    vectors = sample_queries(collection, queries, questions_file)
+    truth = exact_neighbours(collection, vectors, k)
+
+    report = {"queries": len(vectors), "k": k, "nprobe": nprobe}
+    # Every backend runs in its own process so memory and cold load are measured separately
+    for backend, directory in [("chroma", chroma_dir), ("compact", store_dir)]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(measure, backend, directory, vectors, k, nprobe).result()
+        found = result.pop("found")
+        result["recall"] = round(float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if t])), 4)
+        report[backend] = result
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Export Chroma to a compact memory-mapped store and compare the two.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write the compact store from chroma_db")
+    export_parser.add_argument('--dtype', choices=list(DTYPES), default=DEFAULT_DTYPE)
+    export_parser.add_argument('--nlist', type=int, default=0,
+                               help="IVF lists (about sqrt of the vector count); 0 for brute force")
+    compare_parser = commands.add_parser("compare", help="recall, latency and memory against Chroma")
+    compare_parser.add_argument('--queries', type=int, default=200)
+    compare_parser.add_argument('--k', type=int, default=10)
+    compare_parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE)
+    compare_parser.add_argument('--questions', help="file with one question per line, embedded as queries")
+    for sub in (export_parser, compare_parser):
+        sub.add_argument('--chroma-dir', default=CHROMA_DIR)
+        sub.add_argument('--store-dir', default=COMPACT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        import chromadb
+        collection = chromadb.PersistentClient(path=args.chroma_dir).get_or_create_collection(COLLECTION_NAME)
+        export_collection(collection, args.store_dir, args.dtype, args.nlist)
+    else:
+        print(json.dumps(compare(args.chroma_dir, args.store_dir, args.queries, args.k, args.nprobe, args.questions), indent=2))
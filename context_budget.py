@@ -0,0 +1,124 @@
+import re
+import numpy as np
+
+# Ollama gives Mistral a 2048-token context by default; the retrieved text gets most of
+# it, leaving room for the instructions, the question and the answer
+CONTEXT_TOKENS = 1200
+CHARS_PER_TOKEN = 4  # rough size of a Mistral token in English text and code
+STACK_TRACE_LINES = 5  # of a stack trace or kernel log excerpt that are kept
+MAX_UNIT_TOKENS = 64  # longer lines are scored sentence by sentence
+GAP = "[...]"
+
+HEADER_END = "Conversation:"
+# Frames of Java, Python, gdb and kernel traces, raw addresses and dmesg timestamps
+STACK_TRACE_LINE = re.compile(
+    r"^\s*(?:at\s+[\w$.<>/]+\(|#\d+\s+(?:0x[0-9a-f]+|[\w:~]+\s*\()|File \".*\", line \d+|\[<?[0-9a-f]{8,}>?\]"
+    r"|\[\s*\d+\.\d+\]\s|[\w.]+\+0x[0-9a-f]+/0x[0-9a-f]+|0x[0-9a-f]{6,}\b|[0-9a-f]{12,16}\b)",
+    re.IGNORECASE,
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=\S)")
+
+
+def approx_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def trim_stack_traces(lines, keep=STACK_TRACE_LINES):
+    """Shortens every run of stack trace lines to its first keep lines."""
+    trimmed = []
+    run = 0
+    for line in lines:
+        if STACK_TRACE_LINE.match(line):
+            run += 1
+            if run <= keep:
+                trimmed.append(line)
+            continue
+        if run > keep:
+            trimmed.append(f"[... {run - keep} more trace lines]")
+        run = 0
+        trimmed.append(line)
+    if run > keep:
+        trimmed.append(f"[... {run - keep} more trace lines]")
+    return trimmed
+
+
+def split_document(text):
+    # The bug header (everything up to "Conversation:") and the remaining lines
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if line.strip() == HEADER_END:
+            return lines[:i + 1], lines[i + 1:]
+    return lines[:1], lines[1:]
+
+
+def split_units(lines):
+    # (line number, text) pieces that are scored and kept or dropped as a whole
+    units = []
+    for number, line in enumerate(lines):
+        if not line.strip():
+            continue
+        if approx_tokens(line) <= MAX_UNIT_TOKENS:
+            units.append((number, line))
+        else:
+            units.extend((number, sentence) for sentence in SENTENCE_END.split(line) if sentence.strip())
+    return units
+
+
+def join_units(units, kept):
+    # Kept units in their original order; sentences of one line stay on one line
+    lines = []
+    previous = None
+    for i, (number, text) in enumerate(units):
+        if i not in kept:
+            if not lines or lines[-1] != GAP:
+                lines.append(GAP)
+            previous = None
+            continue
+        if previous == number:
+            lines[-1] += " " + text
+        else:
+            lines.append(text)
+        previous = number
+    return lines
+
+
+def compress_documents(texts, question_vector, embed, budget=CONTEXT_TOKENS, stack_trace_lines=STACK_TRACE_LINES):
+    """Fits the texts of retrieved documents into about budget tokens.
+
+    Stack traces are always trimmed to stack_trace_lines. If the texts are still over budget, every header
+    is kept and the remaining lines (or sentences of long lines) are added in order of
+    their embedding's similarity to question_vector until the budget is spent.
+    embed(texts) returns document embeddings. Returns the new texts and
+    (tokens before, tokens after).
+    """
+    before = sum(approx_tokens(text) for text in texts)
+    documents = []
+    for text in texts:
+        header, lines = split_document(text)
+        documents.append((header, split_units(trim_stack_traces(lines, stack_trace_lines))))
+
+    def size(header, units):
+        return approx_tokens("\n".join(header + [text for _, text in units]))
+
+    if sum(size(header, units) for header, units in documents) <= budget:
+        compressed = ["\n".join(header + join_units(units, set(range(len(units))))) for header, units in documents]
+        return compressed, (before, sum(approx_tokens(text) for text in compressed))
+
+    candidates = [(d, i, text) for d, (_, units) in enumerate(documents) for i, (_, text) in enumerate(units)]
+    remaining = budget - sum(approx_tokens("\n".join(header)) for header, _ in documents)
+    kept = [set() for _ in documents]
+    if candidates and remaining > 0:
+        vectors = np.asarray(embed([text for _, _, text in candidates]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(question_vector, dtype=np.float32)
+        scores = vectors @ (query / (np.linalg.norm(query) or 1.0))
+        # Greedy by similarity; a unit that does not fit is skipped for smaller ones
+        for c in np.argsort(-scores, kind="stable"):
+            d, i, text = candidates[c]
+            cost = approx_tokens(text) + 1
+            if cost <= remaining:
+                kept[d].add(i)
+                remaining -= cost
+
+    compressed = ["\n".join(header + join_units(units, kept[d])) for d, (header, units) in enumerate(documents)]
+    return compressed, (before, sum(approx_tokens(text) for text in compressed))
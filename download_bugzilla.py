@@ -1,191 +1,777 @@
 #!/usr/bin/python3
 import requests
+import requests.adapters
+import argparse
+import asyncio
+import email.utils
 import json
+import math
+import multiprocessing
+import queue
+import sys
+import threading
 import time
 import os
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from jsonl_store import JsonlStore, compact, iter_records, json_to_jsonl
+from bug_store import BugStore, import_records
 
 
-# Set the API URL and an array of API keys
+# Set the API URL and an array of API keys. Comments are fetched from <api_url>/<id>/comment.
 api_url = "https://[...]/rest/bug"
 api_keys = [""]
 
-current_key_index = 0  # Start with the first key
-output_file = 'bug_reports.json'
+# Only these fields are requested, so Bugzilla leaves out the rest of each bug and comment
+# (last_change_time is needed by delta sync)
+bug_fields = 'id,summary,product,version,component,creation_time,status,last_change_time'
+comment_fields = 'creator,creation_time,text'
+
+# Connections kept open per host; requests beyond this wait for a free connection
+http_pool_size = 16
+request_timeout = 10
+
+# Per-key budget: sustained requests per second and burst size. Each key backs off
+# on its own when it sees 429/503 or Retry-After and recovers gradually afterwards.
+key_rate = 2.0
+key_burst = 5
+
+# Upper bound on comment requests in flight at once (1 = one request at a time)
+max_in_flight = 8
+
+# Comments for several bugs are fetched in one request. The batch size adapts so
+# that a response stays around target_batch_bytes.
+comment_batch_size = 50
+max_comment_batch_size = 250
+target_batch_bytes = 2 * 1024 * 1024
+
+# Bugs whose comments could not be fetched even on their own are listed here
+failed_bugs_file = 'failed_comment_bugs.txt'
+
+# Bugs are appended to a JSON Lines file and fsynced every fsync_every records.
+# An existing legacy JSON array is converted on first start. An output_file ending in
+# .sqlite3 is a bug_store.BugStore instead, where a bug downloaded again replaces the
+# stored one in place; it is committed every fsync_every bugs.
+output_file = 'bug_reports.jsonl'
+legacy_output_file = 'bug_reports.json'
+fsync_every = 500
+
+# Delta sync only asks for bugs changed since the high-water mark kept here. A fresh
+# export records its start time and every sync the newest change it saw, both minus
+# sync_overlap to absorb clock skew and changes made while fetching.
+sync_state_file = 'sync_state.json'
+sync_overlap = datetime.timedelta(hours=1)
 
 params = {
     'limit': 500,
-    'offset': 0
+    'offset': 0,
+    'include_fields': bug_fields
 }
 
+# Sharded export (--shards N): every shard pages through its own bug id range or
+# creation_time window in its own process, with its own keys, store and resume offset.
+# Finished shards are merged into output_file.
+shard_dir = 'shards'
+
 
 def load_existing_data():
-    if os.path.exists(output_file):
-        try:
-            with open(output_file, 'r') as f:
-                existing_data = json.load(f)
-                print(f"Loaded {len(existing_data)} existing bug reports.")
-                return existing_data
-        except json.JSONDecodeError:
-            backup_file = output_file + ".corrupt_backup"
-            os.rename(output_file, backup_file)
-            print(f"Warning: Failed to parse '{output_file}'. Backed up to '{backup_file}'. Starting fresh.")
-            return []
-    return []
+    sqlite = output_file.endswith('.sqlite3')
+    # One-time migration from the old single JSON array output
+    if not os.path.exists(output_file) and os.path.exists(legacy_output_file):
+        print(f"Converting '{legacy_output_file}' to '{output_file}'...")
+        (import_records if sqlite else json_to_jsonl)(legacy_output_file, output_file)
 
+    store = BugStore(output_file, commit_every=fsync_every) if sqlite else JsonlStore(output_file, fsync_every=fsync_every)
+    print(f"Loaded {store.count} existing bug reports.")
+    return store
 
 
-def save_data(bugs):
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
     try:
-        with open(output_file, 'w') as f:
-            json.dump(bugs, f, indent=4)
-    except (IOError, OSError) as e:
-        print(f"Failed to save data: {e}")
-
-def fetch_comments(bug_id):
-    global current_key_index
-    comments_url = f"https://bugzilla.suse.com/rest/bug/{bug_id}/comment"
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class Throttled(Exception):
+    def __init__(self, status, retry_after):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class KeyGovernor:
+    """Token bucket for one API key that slows down when the server pushes back."""
+
+    def __init__(self, index, api_key, rate, burst):
+        self.index = index
+        self.api_key = api_key
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.strikes = 0
+
+    def reserve(self):
+        # Takes a token and returns 0, or returns the seconds until one is available
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def on_success(self):
+        self.strikes = 0
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def on_throttle(self, retry_after=None):
+        self.strikes += 1
+        self.rate = max(self.max_rate / 64, self.rate / 2)
+        if retry_after is None:
+            retry_after = min(2 ** self.strikes, 300)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+
+
+class KeyPool:
+    """Hands out whichever API key has budget left, spreading load across all keys."""
+
+    def __init__(self, keys, rate=key_rate, burst=key_burst):
+        self.governors = [KeyGovernor(i, key, rate, burst) for i, key in enumerate(keys)]
+        self.next_index = 0
+
+    def try_acquire(self):
+        start = self.next_index
+        self.next_index = (self.next_index + 1) % len(self.governors)
+        shortest_wait = None
+        for i in range(len(self.governors)):
+            governor = self.governors[(start + i) % len(self.governors)]
+            wait = governor.reserve()
+            if wait == 0:
+                return governor, 0.0
+            shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+        return None, shortest_wait
+
+    async def acquire(self):
+        while True:
+            governor, wait = self.try_acquire()
+            if governor is not None:
+                return governor
+            await asyncio.sleep(wait)
+
+
+class Transport:
+    """HTTP session shared by all requests of a process.
+
+    Connections are kept alive and reused, responses are gzip-compressed, and requests,
+    bytes on the wire, decompressed bytes and latency are counted per endpoint.
+    """
+
+    def __init__(self, pool_size=http_pool_size):
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+        self.pool_size = 0
+        self.resize(pool_size)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def resize(self, pool_size):
+        # At least one connection per request in flight, so none is closed after use
+        if pool_size > self.pool_size:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self.pool_size = pool_size
+
+    def get(self, endpoint, url, query):
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, params=query, timeout=request_timeout)
+        except requests.exceptions.RequestException:
+            self.count(endpoint, time.monotonic() - start, 0, 0, failed=True)
+            raise
+        # tell() is what urllib3 read from the socket, before decompression
+        wire_bytes = response.raw.tell() if response.raw is not None else len(response.content)
+        self.count(endpoint, time.monotonic() - start, wire_bytes, len(response.content))
+        return response
+
+    def count(self, endpoint, seconds, wire_bytes, decoded_bytes, failed=False):
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'wire_bytes': 0, 'decoded_bytes': 0, 'seconds': 0.0})
+            stats['requests'] += 1
+            stats['errors'] += failed
+            stats['wire_bytes'] += wire_bytes
+            stats['decoded_bytes'] += decoded_bytes
+            stats['seconds'] += seconds
+
+    def summary(self):
+        lines = []
+        with self.lock:
+            for endpoint, stats in sorted(self.stats.items()):
+                lines.append(
+                    f"{endpoint}: {stats['requests']} requests ({stats['errors']} failed), "
+                    f"{stats['wire_bytes'] / 1e6:.2f} MB received ({stats['decoded_bytes'] / 1e6:.2f} MB decompressed), "
+                    f"{1000 * stats['seconds'] / max(1, stats['requests']):.0f} ms per request"
+                )
+        return lines
+
+
+transport = Transport()
+
+
+def send_request(governor, endpoint, url, query):
+    response = transport.get(endpoint, url, {**query, 'api_key': governor.api_key})
+    if response.status_code in (429, 503):
+        raise Throttled(response.status_code, parse_retry_after(response.headers.get('Retry-After')))
+    response.raise_for_status()
+    return response
+
+
+async def get_with_retries(pool, endpoint, url, query, label):
     network_error_attempts = 0
-    
+
     while True:
+        governor = await pool.acquire()
         try:
-            response = requests.get(comments_url, params={'api_key': api_keys[current_key_index]}, timeout=10)
-            response.raise_for_status()
-
-            comments_data = response.json().get('bugs', {}).get(str(bug_id), {}).get('comments', [])
-            comments_list = []
-            for comment in comments_data:
-                comment_record = {
-                    "name": comment.get('creator', 'Unknown'),
-                    "date": comment.get('creation_time', 'Unknown'),
-                    "text": comment.get('text', '')
-                }
-                comments_list.append(comment_record)
-            return comments_list
+            response = await asyncio.to_thread(send_request, governor, endpoint, url, query)
+            governor.on_success()
+            return response
+
+        except Throttled as e:
+            print(f"HTTP {e.status} for {label} with API key #{governor.index}. Backing off this key.")
+            governor.on_throttle(e.retry_after)
 
         except requests.exceptions.Timeout:
-            print(f"Connection timed out for API key {api_keys[current_key_index]}. Switching API key.")
-            current_key_index = (current_key_index + 1) % len(api_keys)
-            time.sleep(5)
+            print(f"Connection timed out for {label} with API key #{governor.index}.")
+            governor.on_throttle()
 
         except requests.exceptions.HTTPError as e:
-            status = response.status_code
-            if status == 429:
-                print(f"Rate limit exceeded with API key {api_keys[current_key_index]}. Switching API key.")
-                current_key_index = (current_key_index + 1) % len(api_keys)
-                time.sleep(60)
-            elif status == 503:
-                print(f"Service unavailable for Bug #{bug_id}. Retrying with next API key after backoff.")
-                current_key_index = (current_key_index + 1) % len(api_keys)
-                time.sleep(30)
-                network_error_attempts += 1
-            else:
-                print(f"Error fetching comments for Bug #{bug_id}: {e}")
-                return None
-
+            print(f"Error fetching {label}: {e}")
+            return None
 
         except requests.exceptions.RequestException as e:
             wait_time = min(60 * (2 ** network_error_attempts), 43200)
-            print(f"Network error for Bug #{bug_id} with API key {api_keys[current_key_index]}: {e}")
+            print(f"Network error for {label} with API key #{governor.index}: {e}")
             print(f"Waiting {wait_time // 60}m {wait_time % 60}s before retrying...")
-            current_key_index = (current_key_index + 1) % len(api_keys)
-            time.sleep(wait_time)
+            await asyncio.sleep(wait_time)
             network_error_attempts += 1
 
 
-def fetch_bugs(existing_bugs, params):
-    global current_key_index
-    params['offset'] = len(existing_bugs)
-    bugs_since_last_save = 0
+class BatchSizer:
+    """Picks the number of bugs per comment request from the response sizes seen so far."""
+
+    def __init__(self, size=comment_batch_size, maximum=max_comment_batch_size, target_bytes=target_batch_bytes):
+        self.size = size
+        self.maximum = maximum
+        self.target_bytes = target_bytes
 
+    def observe(self, bug_count, response_bytes):
+        bytes_per_bug = max(1.0, response_bytes / bug_count)
+        ideal = int(self.target_bytes / bytes_per_bug)
+        # Move halfway towards the ideal size so one huge bug does not collapse the batch
+        self.size = max(1, min(self.maximum, (self.size + ideal) // 2))
+
+
+async def fetch_comments(bug_ids, pool, sizer, in_flight):
+    # Bugzilla takes the first bug in the path and the rest as repeated ?ids=
+    comments_url = f"{api_url.rstrip('/')}/{bug_ids[0]}/comment"
+    label = f"Bug #{bug_ids[0]}" if len(bug_ids) == 1 else f"{len(bug_ids)} bugs from #{bug_ids[0]}"
+    async with in_flight:
+        print(f"Fetching comments for {label}")
+        response = await get_with_retries(
+            pool, 'comments', comments_url, {'ids': bug_ids[1:], 'include_fields': comment_fields}, label
+        )
+    if response is None:
+        return None
+
+    try:
+        bugs_data = response.json().get('bugs', {})
+    except ValueError:
+        print(f"Error decoding comments JSON for {label}")
+        return None
+    sizer.observe(len(bug_ids), len(response.content))
+
+    # Bugs the response leaves out are not in the result, so the caller fetches them again
+    comments_by_bug = {}
+    for bug_id in bug_ids:
+        bug_data = bugs_data.get(str(bug_id))
+        if not isinstance(bug_data, dict) or 'comments' not in bug_data:
+            continue
+        comments_list = []
+        for comment in bug_data['comments']:
+            comment_record = {
+                "name": comment.get('creator', 'Unknown'),
+                "date": comment.get('creation_time', 'Unknown'),
+                "text": comment.get('text', '')
+            }
+            comments_list.append(comment_record)
+        comments_by_bug[bug_id] = comments_list
+    return comments_by_bug
+
+
+async def fetch_comments_isolating(bug_ids, pool, sizer, in_flight):
+    # A failed batch is split in half until the bug that breaks it is on its own. Bugs
+    # missing from an otherwise good response (e.g. a server that only honours the id in
+    # the path) are fetched again the same way.
+    comments_by_bug = await fetch_comments(bug_ids, pool, sizer, in_flight)
+    if comments_by_bug is None:
+        comments_by_bug, retry = {}, bug_ids
+    else:
+        retry = [bug_id for bug_id in bug_ids if bug_id not in comments_by_bug]
+        if not retry:
+            return comments_by_bug
+        if len(bug_ids) > 1:
+            print(f"Comments of {len(retry)} bugs missing from the batch from #{bug_ids[0]}; fetching them again")
+    if len(bug_ids) == 1:
+        print(f"Giving up on comments for Bug #{bug_ids[0]}.")
+        return {bug_ids[0]: None}
+
+    middle = max(1, len(retry) // 2)
+    parts = [retry[:middle]] + ([retry[middle:]] if retry[middle:] else [])
+    for result in await asyncio.gather(*(fetch_comments_isolating(part, pool, sizer, in_flight) for part in parts)):
+        comments_by_bug.update(result)
+    return comments_by_bug
+
+
+async def fetch_page_comments(bug_ids, pool, sizer, in_flight):
+    batches = []
+    start = 0
+    while start < len(bug_ids):
+        batches.append(bug_ids[start:start + sizer.size])
+        start += len(batches[-1])
+    results = await asyncio.gather(*(fetch_comments_isolating(batch, pool, sizer, in_flight) for batch in batches))
+    comments_by_bug = {}
+    for result in results:
+        comments_by_bug.update(result)
+    return comments_by_bug
+
+
+def record_failed_bugs(bug_ids):
+    try:
+        with open(failed_bugs_file, 'a') as f:
+            f.writelines(f"{bug_id}\n" for bug_id in bug_ids)
+    except (IOError, OSError) as e:
+        print(f"Failed to record bugs without comments: {e}")
+
+
+def make_bug_record(bug, comments):
+    return {
+        "bug_number": bug.get('id', ''),
+        "title": bug.get('summary', 'No title available'),
+        "Product": bug.get('product', 'Unknown'),
+        "version": bug.get('version', 'Unknown'),
+        "Component": bug.get('component', 'Unknown'),
+        "Reported": bug.get('creation_time', 'Unknown'),
+        "Status": bug.get('status', 'Unknown'),
+        "Comments": comments
+    }
+
+
+async def fetch_bug_page(pool, query, label):
+    # Returns the next page of bugs, or None when paging has to stop
     while True:
+        response = await get_with_retries(pool, 'bugs', api_url, query, label)
+        if response is None:
+            return None
+
         try:
-            response = requests.get(api_url, params={**params, 'api_key': api_keys[current_key_index]}, timeout=10)
-            response.raise_for_status()
+            data = response.json()
+        except json.JSONDecodeError:
+            print("Error decoding JSON response for bugs")
+            return None
+        if 'bugs' in data:
+            return data['bugs']
+
+        print("Unexpected response structure: 'bugs' key not found.")
+        print("Raw response:", data)
+        await asyncio.sleep(60)
+
+
+async def store_bug_page(store, bugs, pool, sizer, in_flight):
+    page_comments = await fetch_page_comments([bug.get('id') for bug in bugs], pool, sizer, in_flight)
+
+    # Records are appended in the order the server listed them, so offset resume stays valid
+    failed_ids = []
+    for bug in bugs:
+        comments = page_comments.get(bug.get('id'))
+        if comments is None:
+            failed_ids.append(bug.get('id'))
+            comments = []
+        store.append(make_bug_record(bug, comments))
+
+    if failed_ids:
+        record_failed_bugs(failed_ids)
+        print(f"Stored {len(failed_ids)} bugs without comments; see '{failed_bugs_file}'.")
+
+
+async def fetch_bugs_async(store, params, max_in_flight, keys=None, rate=key_rate, on_page=None):
+    # Returns True once the last page was reached, False if paging stopped on an error
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight))
+    transport.resize(max_in_flight)
+    pool = KeyPool(keys or api_keys, rate)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    sizer = BatchSizer()
+    params['offset'] = store.count
+
+    complete = False
+    while True:
+        bugs = await fetch_bug_page(pool, params, f"bugs at offset {params['offset']}")
+        if bugs is None:
+            break
+        if not bugs:
+            print("No more bugs found.")
+            complete = True
+            break
 
-            try:
-                data = response.json()
-                if 'bugs' not in data:
-                    print("Unexpected response structure: 'bugs' key not found.")
-                    print("Raw response:", data)
-                    time.sleep(60)
-                    continue
-                bugs = data['bugs']
-            except json.JSONDecodeError:
-                print("Error decoding JSON response for bugs")
-                break
-
-            if not bugs:
-                print("No more bugs found.")
-                break
-
-            for bug in bugs:
-                print(f"Fetching Bug #{bug.get('id')}: {bug.get('summary', 'No title available')}")
-                comments = fetch_comments(bug.get('id'))
-
-                if comments is None:
-                    save_data(existing_bugs)
-                    print("Exiting due to failure to fetch comments.")
-                    return existing_bugs
-
-                bug_record = {
-                    "bug_number": bug.get('id', ''),
-                    "title": bug.get('summary', 'No title available'),
-                    "Product": bug.get('product', 'Unknown'),
-                    "version": bug.get('version', 'Unknown'),
-                    "Component": bug.get('component', 'Unknown'),
-                    "Reported": bug.get('creation_time', 'Unknown'),
-                    "Status": bug.get('status', 'Unknown'),
-                    "Comments": comments
-                }
+        await store_bug_page(store, bugs, pool, sizer, in_flight)
+        params['offset'] += len(bugs)
+        if on_page is not None:
+            on_page(store.count)
 
-                existing_bugs.append(bug_record)
-                bugs_since_last_save += 1
+    store.commit()
+    return complete
 
-                if bugs_since_last_save >= 500:
-                    save_data(existing_bugs)
-                    print(f"Saved after {bugs_since_last_save} new bugs.")
-                    bugs_since_last_save = 0
 
-            params['offset'] += len(bugs)
-            time.sleep(2)
+def start_sync_state(store):
+    # A fresh export becomes the starting point for later delta syncs
+    if store.count == 0 and load_sync_state() is None:
+        export_start = datetime.datetime.now(datetime.timezone.utc) - sync_overlap
+        save_sync_state(export_start.strftime('%Y-%m-%dT%H:%M:%SZ'))
 
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 429:
-                print(f"Rate limit exceeded with API key {api_keys[current_key_index]}. Switching API key.")
-                current_key_index = (current_key_index + 1) % len(api_keys)
-                time.sleep(60)
+
+def fetch_bugs(store, params, max_in_flight=max_in_flight):
+    start_sync_state(store)
+    return asyncio.run(fetch_bugs_async(store, params, max_in_flight))
+
+
+def range_query(field, low, high):
+    # Bugzilla's custom search: field >= low and, unless high is None, field < high
+    query = {'f1': field, 'o1': 'greaterthaneq', 'v1': low}
+    if high is not None:
+        query.update({'f2': field, 'o2': 'lessthan', 'v2': high})
+    return query
+
+
+def get_json(query, label):
+    response = asyncio.run(get_with_retries(KeyPool(api_keys), 'bugs', api_url, query, label))
+    if response is None:
+        raise RuntimeError(f"Could not fetch {label}")
+    return response.json()
+
+
+def count_bugs(query, label):
+    # Bugzilla 5 answers count_only with {"bug_count": N}; without it there is no ETA
+    try:
+        return int(get_json({**query, 'count_only': 1}, f"the size of {label}")['bug_count'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def plan_shards(shard_count, shard_by):
+    """Splits the bug space into shard_count queries by bug id range or creation_time window.
+
+    The last shard has no upper bound, so bugs filed during the export are not missed.
+    Id ranges hold similar numbers of bugs; creation_time windows are equally long.
+    """
+    fields = {'limit': 1, 'include_fields': 'id,creation_time'}
+    first = get_json({**fields, 'order': 'bug_id'}, "the first bug")['bugs'][0]
+    last = get_json({**fields, 'order': 'bug_id DESC'}, "the last bug")['bugs'][0]
+
+    if shard_by == 'id':
+        step = math.ceil((last['id'] + 1 - first['id']) / shard_count)
+        bounds = [first['id'] + i * step for i in range(shard_count)] + [None]
+        queries = [range_query('bug_id', bounds[i], bounds[i + 1]) for i in range(shard_count)]
+    else:
+        start, end = (datetime.datetime.fromisoformat(bug['creation_time'].replace('Z', '+00:00')) for bug in (first, last))
+        step = (end - start) / shard_count
+        bounds = [(start + i * step).strftime('%Y-%m-%dT%H:%M:%SZ') for i in range(shard_count)] + [None]
+        queries = [range_query('creation_ts', bounds[i], bounds[i + 1]) for i in range(shard_count)]
+
+    return {
+        "shard_by": shard_by,
+        "shards": [{"query": query, "total": count_bugs(query, f"shard {i}")} for i, query in enumerate(queries)],
+    }
+
+
+def shard_path(index, suffix):
+    return os.path.join(shard_dir, f"shard-{index}{suffix}")
+
+
+def shard_keys(index, shard_count):
+    # Keys are divided between shards; with fewer keys than shards, shards sharing a key
+    # split its rate between them
+    if len(api_keys) >= shard_count:
+        return api_keys[index::shard_count], key_rate
+    sharing = len(range(index % len(api_keys), shard_count, len(api_keys)))
+    return [api_keys[index % len(api_keys)]], key_rate / sharing
+
+
+def run_shard(index, query, keys, rate, max_in_flight, progress, url):
+    # Runs in its own process; per-request messages go to the shard's log, not the terminal
+    global api_url
+    api_url = url
+    sys.stdout = sys.stderr = open(shard_path(index, ".log"), 'a', buffering=1)
+    store = JsonlStore(shard_path(index, ".jsonl"), fsync_every=fsync_every)
+    complete = False
+    try:
+        progress.put((index, store.count, False))
+        query = {**params, **query, 'order': 'bug_id'}
+        complete = asyncio.run(fetch_bugs_async(
+            store, query, max_in_flight, keys, rate, lambda count: progress.put((index, count, False))
+        ))
+        if complete:
+            open(shard_path(index, ".done"), 'w').close()
+    finally:
+        store.close()
+        print_traffic()
+        progress.put((index, store.count, True))
+
+
+def compact_output(store):
+    # Drops superseded versions of bugs; a BugStore already replaced them on append
+    return compact(store.path) if isinstance(store, JsonlStore) else 0
+
+
+def write_manifest(manifest_file, manifest):
+    with open(manifest_file + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+
+def merge_shards(store, shard_count, manifest_file, manifest):
+    # Shards are appended in order; compaction then keeps one record per bug_number.
+    # Once the store is committed the manifest is marked merged and the shard files are
+    # removed, so a later run can't append the same (by then possibly outdated) bugs again.
+    for index in range(shard_count):
+        for record in iter_records(shard_path(index, ".jsonl")):
+            store.append(record)
+    store.close()
+    write_manifest(manifest_file, {**manifest, "merged": True})
+    dropped = compact_output(store)
+    for index in range(shard_count):
+        for suffix in (".jsonl", ".jsonl.offset", ".done"):
+            try:
+                os.remove(shard_path(index, suffix))
+            except FileNotFoundError:
+                pass
+    return dropped
+
+
+def export_sharded(store, shard_count, shard_by, max_in_flight=max_in_flight):
+    """Runs the shards that are not finished yet in parallel processes, then merges them.
+
+    The shard plan is kept in shard_dir, so an interrupted export resumes every shard
+    where it stopped. Returns True once all shards are merged into the store.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    manifest_file = os.path.join(shard_dir, 'manifest.json')
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("merged"):
+            raise ValueError(
+                f"'{shard_dir}' holds an export that was already merged into '{store.path}'; "
+                "use --sync to update it, or remove the directory to export again"
+            )
+        if len(manifest['shards']) != shard_count or manifest['shard_by'] != shard_by:
+            raise ValueError(
+                f"'{shard_dir}' holds an export of {len(manifest['shards'])} shards by {manifest['shard_by']}; "
+                "resume with the same options or remove it"
+            )
+    else:
+        start_sync_state(store)
+        manifest = plan_shards(shard_count, shard_by)
+        write_manifest(manifest_file, manifest)
+
+    pending = [i for i in range(shard_count) if not os.path.exists(shard_path(i, ".done"))]
+    totals = [shard["total"] for shard in manifest["shards"]]
+    context = multiprocessing.get_context("spawn")
+    progress = context.Queue()
+    processes = []
+    for index in pending:
+        keys, rate = shard_keys(index, shard_count)
+        process = context.Process(
+            target=run_shard, args=(index, manifest["shards"][index]["query"], keys, rate, max_in_flight, progress, api_url),
+        )
+        process.start()
+        processes.append(process)
+
+    # One bar per running shard and one for the whole export, whose ETA comes from the
+    # combined rate of all shards. Bars start once every shard has said where it resumed.
+    first, latest, finished = {}, {}, set()
+    bars, overall = {}, None
+    try:
+        while len(finished) < len(pending):
+            try:
+                index, count, done = progress.get(timeout=1)
+            except queue.Empty:
+                # A shard that died without reporting (e.g. killed) counts as finished
+                for index, process in zip(pending, processes):
+                    if process.exitcode is not None:
+                        first.setdefault(index, 0)
+                        finished.add(index)
             else:
-                print(f"Error fetching bugs: {e}")
-                break
+                first.setdefault(index, count)
+                latest[index] = count
+                if done:
+                    finished.add(index)
+            if overall is None and len(first) == len(pending):
+                bars = {
+                    index: tqdm(desc=f"Shard {index}", unit="bug", total=totals[index], initial=first[index], position=i)
+                    for i, index in enumerate(pending)
+                }
+                pending_total = None if None in (totals[i] for i in pending) else sum(totals[i] for i in pending)
+                overall = tqdm(desc="Total", unit="bug", total=pending_total, initial=sum(first.values()), position=len(pending))
+            if overall is not None:
+                for index, bar in bars.items():
+                    step = latest.get(index, bar.n) - bar.n
+                    if step:
+                        bar.update(step)
+                        overall.update(step)
+    finally:
+        for process in processes:
+            process.join()
+        for bar in [*bars.values(), overall]:
+            if bar is not None:
+                bar.close()
+
+    unfinished = [i for i in range(shard_count) if not os.path.exists(shard_path(i, ".done"))]
+    if unfinished:
+        print(f"Shards {unfinished} stopped early (see their logs in '{shard_dir}'); run again to resume them.")
+        return False
+    dropped = merge_shards(store, shard_count, manifest_file, manifest)
+    print(f"Merged {shard_count} shards into '{output_file}', dropping {dropped} duplicate bug records.")
+    return True
+
+
+def load_sync_state():
+    try:
+        with open(sync_state_file, 'r') as f:
+            return json.load(f)['last_change_time']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def save_sync_state(last_change_time):
+    tmp_file = sync_state_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({"last_change_time": last_change_time}, f)
+    os.replace(tmp_file, sync_state_file)
+
+
+async def sync_bugs_async(store, since, max_in_flight):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight))
+    transport.resize(max_in_flight)
+    pool = KeyPool(api_keys)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    sizer = BatchSizer()
+    query = {**params, 'last_change_time': since, 'order': 'bug_id', 'offset': 0}
+
+    # Bugzilla returns bugs changed at or after `since` (ISO timestamps compare correctly
+    # as strings). The next high-water mark is the newest change seen minus sync_overlap:
+    # a bug changed while we were paging can move to an offset already fetched, and
+    # Bugzilla nodes may lag or disagree on the time. Bugs fetched again next time just
+    # replace their stored version.
+    newest_change = since
+    while True:
+        bugs = await fetch_bug_page(pool, query, f"bugs changed since {since} at offset {query['offset']}")
+        if bugs is None:
+            return None
+        if not bugs:
+            break
+
+        await store_bug_page(store, bugs, pool, sizer, in_flight)
+        for bug in bugs:
+            newest_change = max(newest_change, bug.get('last_change_time') or newest_change)
+        query['offset'] += len(bugs)
+
+    store.commit()
+    print(f"Synced {query['offset']} bugs changed since {since}.")
+    newest_change = datetime.datetime.fromisoformat(newest_change.replace('Z', '+00:00'))
+    return max(since, (newest_change - sync_overlap).strftime('%Y-%m-%dT%H:%M:%SZ'))
 
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed at offset {params['offset']} with API key {api_keys[current_key_index]}: {e}")
-            current_key_index = (current_key_index + 1) % len(api_keys)
-            time.sleep(30)
-            continue
 
-    # Final save
-    if bugs_since_last_save > 0:
-        save_data(existing_bugs)
-        print(f"Final save after last {bugs_since_last_save} bugs.")
+def sync_bugs(store, since, max_in_flight=max_in_flight):
+    # Changed bugs are appended as new versions; compaction afterwards keeps the latest one
+    high_water_mark = asyncio.run(sync_bugs_async(store, since, max_in_flight))
+    store.close()
+    dropped = compact_output(store)
+    print(f"Replaced {dropped} outdated bug records.")
+    if high_water_mark is not None:
+        save_sync_state(high_water_mark)
+    return high_water_mark
 
-    return existing_bugs
+
+def print_traffic():
+    for line in transport.summary():
+        print(f"HTTP {line}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download bugs and their comments from Bugzilla.")
+    parser.add_argument('--api-url', default=api_url,
+                        help=f"Bugzilla bug list endpoint; comments come from <api-url>/<id>/comment (default: {api_url})")
+    parser.add_argument('--max-in-flight', type=int, default=max_in_flight,
+                        help=f"concurrent comment requests (default: {max_in_flight})")
+    parser.add_argument('--sync', action='store_true',
+                        help="only fetch bugs changed since the last export or sync and update them in place")
+    parser.add_argument('--since',
+                        help="with --sync, override the stored high-water mark (e.g. 2024-01-01T00:00:00Z)")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="run the full export as N parallel shards and merge them (default: one process)")
+    parser.add_argument('--shard-by', choices=['id', 'created'], default='id',
+                        help="split the bug space by bug id range or creation_time window (default: id)")
+    args = parser.parse_args()
+    api_url = args.api_url
+
     start_time = datetime.datetime.now()
-    existing_bugs = load_existing_data()
+    store = load_existing_data()
 
     try:
-        bugs = fetch_bugs(existing_bugs, params)
-        duration = (datetime.datetime.now() - start_time).total_seconds()
-        print(f"Processed {len(bugs)} bugs in {duration:.1f} seconds.")
+        if args.sync:
+            since = args.since or load_sync_state()
+            if since is None:
+                parser.error(f"no high-water mark in '{sync_state_file}'; pass --since")
+            sync_bugs(store, since, max(1, args.max_in_flight))
+            duration = (datetime.datetime.now() - start_time).total_seconds()
+            print(f"Sync finished in {duration:.1f} seconds.")
+        elif args.shards > 1:
+            try:
+                exported = export_sharded(store, args.shards, args.shard_by, max(1, args.max_in_flight))
+            except ValueError as e:
+                parser.error(str(e))
+            if exported:
+                duration = (datetime.datetime.now() - start_time).total_seconds()
+                print(f"Sharded export finished in {duration:.1f} seconds.")
+        else:
+            fetch_bugs(store, params, max(1, args.max_in_flight))
+            duration = (datetime.datetime.now() - start_time).total_seconds()
+            print(f"Processed {store.count} bugs in {duration:.1f} seconds.")
     except KeyboardInterrupt:
         print("\nInterrupted by user. Saving data and exiting gracefully...")
-        save_data(existing_bugs)
+        store.close()
         print("Data saved. Goodbye.")
     except requests.exceptions.RequestException as e:
         print(f"Network error occurred during bug fetching: {e}")
-        save_data(existing_bugs)
         print("Exiting due to persistent network issues.")
+    finally:
+        store.close()
+        print_traffic()
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_DIR = "embedding_cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def chunked(items, size=500):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class EmbeddingCache:
+    """On-disk embedding vectors keyed by (model name, text hash).
+
+    Vectors live in fixed-size slots of a memory-mapped float32 file and a SQLite
+    index maps keys to slots. Once the file holds max_bytes worth of vectors the
+    least recently used entries give up their slots. Several processes can share
+    one cache directory.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.vectors = None
+        self.dim = None
+        self.capacity = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model_name, text):
+        return f"{model_name}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
+
+    def _open_vectors(self, dim=None):
+        # The vector file is created with the first put, once the dimension is known
+        stored_dim = self._meta("dim")
+        if stored_dim is None:
+            if dim is None:
+                return False
+            self._set_meta("dim", dim)
+            stored_dim = dim
+        elif dim is not None and dim != stored_dim:
+            raise ValueError(f"Cache holds {stored_dim}-dimensional vectors, got {dim}")
+
+        capacity = max(self._meta("capacity") or 0, self.max_bytes // (stored_dim * 4))
+        if self.vectors is None or capacity != self.capacity:
+            self._set_meta("capacity", capacity)
+            size = capacity * stored_dim * 4
+            if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) < size:
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(size)
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, stored_dim))
+            self.dim, self.capacity = stored_dim, capacity
+        return True
+
+    def get_many(self, keys):
+        with self.lock:
+            return self._get_many_locked(keys)
+
+    def _get_many_locked(self, keys):
+        if self.vectors is None:
+            with self.conn:
+                if not self._open_vectors():
+                    return {}
+
+        found = {}
+        for part in chunked(list(set(keys))):
+            placeholders = ",".join("?" * len(part))
+            rows = self.conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part).fetchall()
+            if not rows:
+                continue
+            vectors = {key: np.array(self.vectors[slot]) for key, slot in rows}
+            # A slot can be recycled between the lookup and the copy; only keep
+            # vectors whose key still owns the same slot afterwards.
+            with self.conn:
+                current = dict(self.conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part).fetchall())
+                self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", ((time.time(), key) for key, _ in rows))
+            for key, slot in rows:
+                if current.get(key) == slot:
+                    found[key] = vectors[key]
+        return found
+
+    def _reserve_slots(self, count):
+        # Slots come from the unused tail of the file first, then from the least recently
+        # used entries. Evictions are committed before the slots are overwritten.
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            next_slot = self._meta("next_slot") or 0
+            slots = list(range(next_slot, min(self.capacity, next_slot + count)))
+            self._set_meta("next_slot", next_slot + len(slots))
+
+            if len(slots) < count:
+                victims = self.conn.execute(
+                    "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (count - len(slots),)
+                ).fetchall()
+                self.conn.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key, _ in victims))
+                slots.extend(slot for _, slot in victims)
+        return slots
+
+    def put_many(self, items):
+        with self.lock:
+            return self._put_many_locked(items)
+
+    def _put_many_locked(self, items):
+        if not items:
+            return
+        with self.conn:
+            self._open_vectors(len(next(iter(items.values()))))
+
+        existing = set()
+        keys = list(items)
+        for part in chunked(keys):
+            placeholders = ",".join("?" * len(part))
+            existing.update(row[0] for row in self.conn.execute(f"SELECT key FROM entries WHERE key IN ({placeholders})", part))
+        keys = [key for key in keys if key not in existing][:self.capacity]
+        if not keys:
+            return
+
+        slots = self._reserve_slots(len(keys))
+        for key, slot in zip(keys, slots):
+            self.vectors[slot] = items[key]
+        self.vectors.flush()
+
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                ((key, slot, now) for key, slot in zip(keys, slots)),
+            )
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings that only run the wrapped model for texts not in the cache."""
+
+    def __init__(self, embedding, model_name, cache=None):
+        self.embedding = embedding
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache()
+
+    def _embed(self, texts, namespace, embed):
+        keys = [EmbeddingCache.key(namespace, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = np.asarray(embed(list(missing.values())), dtype=np.float32)
+            computed = dict(zip(missing, vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, self.model_name, self.embedding.embed_documents)
+
+    def embed_documents_uncached(self, texts):
+        """Runs the model without reading or writing the cache, for throwaway texts."""
+        return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text):
+        # Queries get their own namespace since some models embed them differently
+        return self._embed([text], self.model_name + "#query", lambda texts: [self.embedding.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts):
+        """Query embeddings for many texts, computed in one forward pass where possible."""
+        return self._embed(texts, self.model_name + "#query", self._embed_queries)
+
+    def _embed_queries(self, texts):
+        # HuggingFaceEmbeddings embeds queries like documents unless query_encode_kwargs is set;
+        # other models may embed queries differently, so they get one call per text
+        if hasattr(self.embedding, "query_encode_kwargs") and not self.embedding.query_encode_kwargs:
+            return self.embedding.embed_documents(texts)
+        return [self.embedding.embed_query(text) for text in texts]
@@ -1,20 +1,58 @@
-import json
 import os
 import logging
+import hashlib
+import sqlite3
 import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import chromadb
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain.docstore.document import Document
+from langchain_core.documents import Document
 from tqdm import tqdm
 import pickle
+from jsonl_store import iter_bugs
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from bug_filters import bug_metadata
+from lexical_index import LEXICAL_DB, LexicalIndex
+from compact_store import DEFAULT_DTYPE, export_collection
+from metrics import REGISTRY
+from chunking import CHUNK_TOKENS, chunk_text, length_sorted_batches, load_tokenizer
 
 # Configuration
-JSON_FILE = "bug_reports.json"
+JSON_FILE = "bug_reports.jsonl"  # JSON Lines, the legacy JSON array or a bug_store.py database
 CHROMA_DIR = "chroma_db"
-CHECKPOINT_FILE = "indexed_bugs_checkpoint.pkl"
+COLLECTION_NAME = "langchain"  # default collection of langchain_chroma.Chroma
+CHECKPOINT_DB = "index_checkpoint.sqlite3"  # bug_id -> hash of the indexed text
+LEXICAL_INDEX_DB = LEXICAL_DB  # full texts and FTS5 keyword index, used by query_interface.py
+LEGACY_CHECKPOINT_FILE = "indexed_bugs_checkpoint.pkl"
+# Set to e.g. "compact_store" to re-export the compact store (see compact_store.py) after every run
+COMPACT_STORE_DIR = None
+COMPACT_DTYPE = DEFAULT_DTYPE
+COMPACT_NLIST = 0  # IVF lists; about sqrt of the number of chunks
 
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_CACHE_DIR = "embedding_cache"  # shared with query_interface.py
 BATCH_SIZE = 1000
+EMBED_BATCH_SIZE = 32  # chunks per forward pass, grouped by token count
+
+# Embedding runs in worker processes; at most QUEUE_DEPTH batches wait between stages
+EMBED_WORKERS = max(1, min(4, (os.cpu_count() or 1) // 2))
+QUEUE_DEPTH = 2 * EMBED_WORKERS
+
+# Rewritten as the run progresses; app.py's /metrics serves it next to its own metrics
+INDEX_METRICS_FILE = "index_metrics.prom"
+METRICS_INTERVAL = 5  # seconds between rewrites
+
+PROCESSED = REGISTRY.gauge("bugzilla_indexer_processed", "Bugs read, documents embedded and documents written in the current run.", ["stage"])
+THROUGHPUT = REGISTRY.gauge("bugzilla_indexer_per_second", "Average rate of each stage over the current run.", ["stage"])
+BATCH_SECONDS = REGISTRY.histogram("bugzilla_indexer_batch_seconds", "Seconds per batch and stage.", ["stage"])
+BATCH_DOCUMENTS = REGISTRY.histogram(
+    "bugzilla_indexer_batch_documents", "Documents per embedded batch.", buckets=(100, 250, 500, 1000, 2500, 5000, 10000)
+)
+LAST_UPDATE = REGISTRY.gauge("bugzilla_indexer_last_update_timestamp_seconds", "When the indexer last wrote its metrics.")
 
 # Setup logging
 logging.basicConfig(
@@ -22,18 +60,48 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
-def load_checkpoint():
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, "rb") as f:
-            return pickle.load(f)
-    return set()
+def open_checkpoint():
+    conn = sqlite3.connect(CHECKPOINT_DB, timeout=60, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS indexed (bug_id TEXT PRIMARY KEY, content_hash TEXT)")
 
-def save_checkpoint(indexed_ids):
-    with open(CHECKPOINT_FILE, "wb") as f:
-        pickle.dump(indexed_ids, f)
+    # Bugs from the old pickle checkpoint have no hash yet; the first run adopts the
+    # current hash for them instead of re-embedding the whole corpus.
+    if os.path.exists(LEGACY_CHECKPOINT_FILE):
+        with open(LEGACY_CHECKPOINT_FILE, "rb") as f:
+            legacy_ids = pickle.load(f)
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO indexed VALUES (?, NULL)", ((str(i),) for i in legacy_ids))
+        os.rename(LEGACY_CHECKPOINT_FILE, LEGACY_CHECKPOINT_FILE + ".migrated")
+        logging.info(f"Migrated {len(legacy_ids)} bug IDs from {LEGACY_CHECKPOINT_FILE}.")
+    return conn
 
-def bug_to_text(bug):
-    header = (
+def lookup_checkpoint(conn, bug_ids):
+    placeholders = ",".join("?" * len(bug_ids))
+    rows = conn.execute(f"SELECT bug_id, content_hash FROM indexed WHERE bug_id IN ({placeholders})", bug_ids)
+    return dict(rows.fetchall())
+
+def save_checkpoint(conn, hashes):
+    with conn:
+        conn.executemany(
+            "INSERT INTO indexed VALUES (?, ?) ON CONFLICT(bug_id) DO UPDATE SET content_hash = excluded.content_hash",
+            hashes.items(),
+        )
+
+# Bumped when the metadata stored on each chunk changes; vectors indexed under an
+# older version get the new metadata written in place instead of being re-embedded
+METADATA_VERSION = 1
+
+def content_hash(bug):
+    # The chunk size is part of the hash so changing it re-indexes every bug
+    return hashlib.sha1(f"{CHUNK_TOKENS}:m{METADATA_VERSION}:{bug_to_text(bug)}".encode("utf-8")).hexdigest()
+
+def legacy_content_hash(bug):
+    # The hash used before chunks carried the filterable bug fields
+    return hashlib.sha1(f"{CHUNK_TOKENS}:{bug_to_text(bug)}".encode("utf-8")).hexdigest()
+
+def bug_header(bug):
+    return (
         f"Bug #{bug.get('bug_number')}\n"
         f"Title: {bug.get('title', '')}\n"
         f"Product: {bug.get('Product', '')} | Version: {bug.get('version', '')}\n"
@@ -42,51 +110,286 @@ def bug_to_text(bug):
         f"Status: {bug.get('Status', '')}\n\n"
         "Conversation:\n"
     )
+
+def bug_comment_lines(bug):
     comments = bug.get("Comments", [])
-    body = "\n".join(f"{c.get('name', 'unknown')}: {c.get('text', '').strip()}" for c in comments if c.get("text", "").strip())
-    return header + body
+    return [f"{c.get('name', 'unknown')}: {c.get('text', '').strip()}" for c in comments if c.get("text", "").strip()]
+
+def bug_to_text(bug):
+    return bug_header(bug) + "\n".join(bug_comment_lines(bug))
 
-def create_documents(bugs):
+def create_documents(bugs, tokenizer=None):
+    # With a tokenizer every bug is split into chunks that fit the embedding model,
+    # each repeating the bug header, instead of one document the model would truncate
+    # Product, component, version, status and report time go on every chunk for filtering
     documents = []
     for bug in bugs:
-        content = bug_to_text(bug).strip()
         bug_id = str(bug.get("bug_number", "unknown"))
-        if content:
-            documents.append(Document(page_content=content, metadata={"bug_id": bug_id}))
+        metadata = bug_metadata(bug)
+        if tokenizer is None:
+            content = bug_to_text(bug).strip()
+            if content:
+                documents.append(Document(page_content=content, metadata={"bug_id": bug_id, **metadata}))
+            continue
+        for i, (text, tokens) in enumerate(chunk_text(tokenizer, bug_header(bug), bug_comment_lines(bug))):
+            documents.append(Document(page_content=text, metadata={"bug_id": bug_id, "chunk": i, "tokens": tokens, **metadata}))
     return documents
 
-def main():
-    logging.info("Loading bugs from file...")
-    with open(JSON_FILE, "r", encoding="utf-8") as f:
-        bugs = json.load(f)
-    logging.info(f"Loaded {len(bugs)} bugs.")
+def document_id(doc):
+    if "chunk" in doc.metadata:
+        return f"{doc.metadata['bug_id']}-{doc.metadata['chunk']}"
+    return doc.metadata["bug_id"]
 
-    embedding = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    vectorstore = Chroma(persist_directory=CHROMA_DIR, embedding_function=embedding)
+# Stage 2: runs in the worker processes, each holding its own copy of the model
+worker_embedding = None
+worker_tokenizer = None
 
-    indexed_ids = load_checkpoint()
-    logging.info(f"Loaded checkpoint with {len(indexed_ids)} indexed bug IDs.")
+def init_worker(model_name, threads):
+    global worker_embedding, worker_tokenizer
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    # Texts embedded before (e.g. when rebuilding chroma_db) come from the cache
+    worker_embedding = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=model_name), model_name, EmbeddingCache(EMBED_CACHE_DIR)
+    )
+    worker_tokenizer = load_tokenizer(model_name)
+
+def embed_batch(bugs):
+    start = time.time()
+    documents = create_documents(bugs, worker_tokenizer)
+    vectors = [None] * len(documents)
+    for indices in length_sorted_batches([doc.metadata["tokens"] for doc in documents], EMBED_BATCH_SIZE):
+        embedded = worker_embedding.embed_documents([documents[i].page_content for i in indices])
+        for i, vector in zip(indices, embedded):
+            vectors[i] = vector
+    return documents, np.asarray(vectors, dtype=np.float32), time.time() - start
 
-    # Filter out already indexed
-    bugs_to_index = [b for b in bugs if str(b.get("bug_number")) not in indexed_ids]
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-    batches = [bugs_to_index[i:i + BATCH_SIZE] for i in range(0, len(bugs_to_index), BATCH_SIZE)]
+def classify_bugs(conn, bugs):
+    # Returns (bug, hash, replaces_existing) for every bug that is new or changed, and
+    # {bug_id: hash} for bugs whose vectors are current but lack the current metadata
+    hashes = {str(bug.get("bug_number")): content_hash(bug) for bug in bugs}
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO temp.seen VALUES (?)", ((i,) for i in hashes))
+    known = lookup_checkpoint(conn, list(hashes))
 
-    for i, batch in enumerate(tqdm(batches, desc="Indexing batches")):
-        documents = create_documents(batch)
-        non_empty_docs = [doc for doc in documents if doc.page_content.strip()]
-        if not non_empty_docs:
-            logging.warning(f"Batch {i + 1}: All documents were empty. Skipping.")
+    changed, retagged = [], {}
+    for bug in bugs:
+        bug_id = str(bug.get("bug_number"))
+        if bug_id not in known:
+            changed.append((bug, hashes[bug_id], False))
+        elif known[bug_id] == hashes[bug_id]:
             continue
+        elif known[bug_id] is None or known[bug_id] == legacy_content_hash(bug):
+            retagged[bug_id] = hashes[bug_id]
+        else:
+            changed.append((bug, hashes[bug_id], True))
+    return changed, retagged
 
+def lexical_rows(bugs):
+    rows = []
+    for bug in bugs:
         try:
-            vectorstore.add_documents(non_empty_docs)
-            for bug in batch:
-                indexed_ids.add(str(bug.get("bug_number")))
-            save_checkpoint(indexed_ids)
-            logging.info(f"Batch {i + 1}: Indexed {len(non_empty_docs)} bugs. Total indexed: {len(indexed_ids)}")
+            bug_number = int(bug.get("bug_number"))
+        except (TypeError, ValueError):
+            continue
+        rows.append((bug_number, bug.get("title", ""), bug_to_text(bug), bug_metadata(bug)))
+    return rows
+
+# Stage 1: streams the bug file and yields (bugs, hashes, replaced ids, retagged metadata)
+# for new or changed bugs and for bugs whose vectors only need new metadata.
+# The lexical index is cheap to update and keeps its own hashes, so it is brought up to date here.
+def read_batches(conn, lexical, progress):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (bug_id TEXT PRIMARY KEY)")
+    batch, hashes, replaced, retagged = [], {}, set(), {}
+    for chunk in iter_chunks(iter_bugs(JSON_FILE), BATCH_SIZE):
+        progress.update(len(chunk))
+        lexical.update(lexical_rows(chunk))
+        changed, retag_hashes = classify_bugs(conn, chunk)
+        for bug in chunk:
+            bug_id = str(bug.get("bug_number"))
+            if bug_id in retag_hashes:
+                retagged[bug_id] = bug_metadata(bug)
+                hashes[bug_id] = retag_hashes[bug_id]
+        for bug, bug_hash, replaces_existing in changed:
+            bug_id = str(bug.get("bug_number"))
+            batch.append(bug)
+            hashes[bug_id] = bug_hash
+            if replaces_existing:
+                replaced.add(bug_id)
+        if len(batch) >= BATCH_SIZE or len(retagged) >= BATCH_SIZE:
+            yield batch, hashes, replaced, retagged
+            batch, hashes, replaced, retagged = [], {}, set(), {}
+    if batch or retagged:
+        yield batch, hashes, replaced, retagged
+
+def delete_vectors(collection, bug_ids):
+    bug_ids = list(bug_ids)
+    for i in range(0, len(bug_ids), 500):
+        collection.delete(where={"bug_id": {"$in": bug_ids[i:i + 500]}})
+
+def retag_vectors(collection, retagged, max_write_batch):
+    # Writes the current metadata onto existing vectors, whatever their IDs
+    bug_ids = list(retagged)
+    for i in range(0, len(bug_ids), 500):
+        found = collection.get(where={"bug_id": {"$in": bug_ids[i:i + 500]}}, include=["metadatas"])
+        metadatas = [{**metadata, **retagged[metadata["bug_id"]]} for metadata in found["metadatas"]]
+        for j in range(0, len(found["ids"]), max_write_batch):
+            collection.update(ids=found["ids"][j:j + max_write_batch], metadatas=metadatas[j:j + max_write_batch])
+
+def delete_stale(conn, collection, lexical):
+    # Bugs that are in the checkpoint but were not in this run's input
+    stale = [row[0] for row in conn.execute("SELECT bug_id FROM indexed WHERE bug_id NOT IN (SELECT bug_id FROM temp.seen)")]
+    if stale:
+        delete_vectors(collection, stale)
+        lexical.delete(bug_id for bug_id in stale if bug_id.isdigit())
+        with conn:
+            conn.executemany("DELETE FROM indexed WHERE bug_id = ?", ((i,) for i in stale))
+    return len(stale)
+
+# Stage 3: the only thread that writes to Chroma; checkpoint writes are O(batch)
+def write_results(results, collection, max_write_batch, progress):
+    conn = open_checkpoint()
+    while True:
+        item = results.get()
+        if item is None:
+            conn.close()
+            return
+        hashes, replaced, retagged, documents, vectors = item
+        start = time.time()
+        try:
+            if retagged:
+                retag_vectors(collection, retagged, max_write_batch)
+            # Old vectors of a changed bug may have other IDs (pickle-era UUIDs, a different
+            # number of chunks), so drop them first
+            if replaced:
+                delete_vectors(collection, replaced)
+            # Chunking can turn one batch of bugs into more documents than Chroma accepts at once
+            for i in range(0, len(documents), max_write_batch):
+                part = documents[i:i + max_write_batch]
+                collection.upsert(
+                    ids=[document_id(doc) for doc in part],
+                    embeddings=vectors[i:i + max_write_batch],
+                    documents=[doc.page_content for doc in part],
+                    metadatas=[doc.metadata for doc in part],
+                )
+            save_checkpoint(conn, hashes)
+            progress.update(len(documents))
+            BATCH_SECONDS.observe(time.time() - start, stage="write")
         except Exception as e:
-            logging.error(f"Batch {i + 1}: Failed to index due to error: {e}")
+            logging.error(f"Failed to write batch of {len(documents)} documents due to error: {e}")
+
+def export_metrics(start_time, progress_bars):
+    elapsed = max(time.time() - start_time, 1e-9)
+    for stage, progress in progress_bars.items():
+        PROCESSED.set(progress.n, stage=stage)
+        THROUGHPUT.set(round(progress.n / elapsed, 3), stage=stage)
+    LAST_UPDATE.set(round(time.time(), 3))
+    try:
+        REGISTRY.write_textfile(INDEX_METRICS_FILE)
+    except OSError as e:
+        logging.warning(f"Could not write {INDEX_METRICS_FILE}: {e}")
+
+def main():
+    conn = open_checkpoint()
+    indexed_count = conn.execute("SELECT COUNT(*) FROM indexed").fetchone()[0]
+    logging.info(f"Loaded checkpoint with {indexed_count} indexed bug IDs.")
+
+    lexical = LexicalIndex(LEXICAL_INDEX_DB)
+    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    collection = client.get_or_create_collection(COLLECTION_NAME, embedding_function=None)
+
+    read_progress = tqdm(desc="Read", unit="bug", position=0)
+    embed_progress = tqdm(desc="Embedded", unit="doc", position=1)
+    write_progress = tqdm(desc="Written", unit="doc", position=2)
+    progress_bars = {"read": read_progress, "embed": embed_progress, "write": write_progress}
+    start_time = time.time()
+    last_export = start_time
+    read_complete = False
+
+    results = queue.Queue(maxsize=QUEUE_DEPTH)
+    writer = threading.Thread(target=write_results, args=(results, collection, client.get_max_batch_size(), write_progress))
+    writer.start()
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // EMBED_WORKERS)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=EMBED_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(EMBED_MODEL, threads_per_worker),
+        ) as executor:
+            pending = {}
+
+            def drain():
+                nonlocal last_export
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    hashes, replaced, retagged = pending.pop(future)
+                    try:
+                        documents, vectors, seconds = future.result()
+                    except Exception as e:
+                        logging.error(f"Failed to embed batch due to error: {e}")
+                        continue
+                    embed_progress.update(len(documents))
+                    BATCH_SECONDS.observe(seconds, stage="embed")
+                    BATCH_DOCUMENTS.observe(len(documents))
+                    results.put((hashes, replaced, retagged, documents, vectors))
+                if time.time() - last_export >= METRICS_INTERVAL:
+                    export_metrics(start_time, progress_bars)
+                    last_export = time.time()
+
+            for batch, hashes, replaced, retagged in read_batches(conn, lexical, read_progress):
+                if not batch:
+                    # Only metadata to write, nothing to embed
+                    results.put((hashes, replaced, retagged, [], None))
+                    continue
+                # Back-pressure: the reader waits while the workers are saturated
+                while len(pending) >= QUEUE_DEPTH:
+                    drain()
+                pending[executor.submit(embed_batch, batch)] = (hashes, replaced, retagged)
+            while pending:
+                drain()
+        read_complete = True
+    finally:
+        results.put(None)
+        writer.join()
+        export_metrics(start_time, progress_bars)
+        for progress in progress_bars.values():
+            progress.close()
+
+    # Only a complete pass over the input tells which bugs disappeared
+    if read_complete:
+        stale_count = delete_stale(conn, collection, lexical)
+        if stale_count:
+            logging.info(f"Deleted {stale_count} bugs that are no longer in {JSON_FILE}.")
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    indexed_count = conn.execute("SELECT COUNT(*) FROM indexed").fetchone()[0]
+    conn.close()
+    lexical_count = lexical.count()
+    lexical.close()
+    logging.info(
+        f"Read {read_progress.n} bugs ({read_progress.n / elapsed:.1f}/s), "
+        f"embedded {embed_progress.n} docs ({embed_progress.n / elapsed:.1f}/s), "
+        f"wrote {write_progress.n} docs ({write_progress.n / elapsed:.1f}/s). "
+        f"Total indexed: {indexed_count} (lexical index: {lexical_count})"
+    )
+
+    if COMPACT_STORE_DIR and read_complete:
+        export_collection(collection, COMPACT_STORE_DIR, COMPACT_DTYPE, COMPACT_NLIST)
 
     # Show final DB size
     db_file = os.path.join(CHROMA_DIR, "chroma.sqlite3")
@@ -0,0 +1,255 @@
+import heapq
+import threading
+import time
+import uuid
+from collections import deque
+
+# A job runs through these stages; each one ends when the runner yields the named event
+STAGES = [("retrieve", "sources"), ("generate", "done")]
+DEFAULT_STAGE_SECONDS = {"retrieve": 1.0, "generate": 5.0}  # until real timings exist
+TIMING_WINDOW = 200
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when no more jobs can be queued."""
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Job:
+    def __init__(self, question, options=None, record_timings=True):
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.options = options or {}
+        self.record_timings = record_timings
+        self.state = "queued"
+        self.events = []
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stage = None
+        self.stage_started = None
+        self.last_seen = self.created
+        self.cancelled = threading.Event()
+
+    @property
+    def done(self):
+        return self.state in ("done", "failed", "cancelled")
+
+
+class JobScheduler:
+    """Runs jobs on a fixed pool of worker threads fed from a bounded FIFO queue.
+
+    run(job) is called on a worker thread and yields the job's events, which are
+    recorded on the job for pollers and streaming readers; job.options holds the
+    options given to submit(). Jobs submitted with record_timings=False (e.g. batch
+    work that skips stages) are left out of the timings. A job is cancelled when
+    cancel() is called or when nobody has looked at it for abandon_after seconds;
+    a running job stops at its next event. Finished jobs are kept for keep_finished
+    seconds. Stage timings of recent jobs drive the ETAs.
+    """
+
+    def __init__(self, run, workers=1, max_queue=20, abandon_after=30, keep_finished=300):
+        self.run = run
+        self.workers = workers
+        self.max_queue = max_queue
+        self.abandon_after = abandon_after
+        self.keep_finished = keep_finished
+        self.queue = deque()
+        self.running = {}
+        self.jobs = {}
+        self.timings = {name: deque(maxlen=TIMING_WINDOW) for name in ["wait"] + [stage for stage, _ in STAGES]}
+        self.condition = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+    def submit(self, question, options=None, record_timings=True):
+        with self.condition:
+            self._purge(time.time())
+            if len(self.queue) >= self.max_queue:
+                raise QueueFull(f"{len(self.queue)} jobs are already waiting")
+            job = Job(question, options, record_timings)
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self.condition.notify_all()
+            return job
+
+    def get(self, job_id):
+        with self.condition:
+            self._purge(time.time())
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.last_seen = time.time()
+            return job
+
+    def cancel(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.done:
+                return job
+            job.cancelled.set()
+            if job.state == "queued":
+                self.queue.remove(job)
+                self._finish(job, "cancelled")
+            return job
+
+    def follow(self, job, heartbeat=5.0):
+        """Yields the job's events as they arrive, keeping the job alive meanwhile.
+
+        While the job waits, a "queued" event with its position and ETA is yielded
+        whenever the position changes, and a "heartbeat" event after heartbeat
+        seconds without news, so streaming responses notice a gone client.
+        """
+        index = 0
+        position = None
+        last_yield = time.time()
+        while True:
+            with self.condition:
+                job.last_seen = time.time()
+                if index == len(job.events) and not job.done:
+                    self.condition.wait(heartbeat)
+                    job.last_seen = time.time()
+                events = job.events[index:]
+                index = len(job.events)
+                queued = None
+                if job.state == "queued" and self.position(job) != position:
+                    position = self.position(job)
+                    queued = {"event": "queued", "position": position, **self._estimate(job)}
+                done = job.done and index == len(job.events)
+            if queued or events:
+                last_yield = time.time()
+            elif time.time() - last_yield >= heartbeat:
+                last_yield = time.time()
+                yield {"event": "heartbeat"}
+            if queued:
+                yield queued
+            yield from events
+            if done:
+                return
+
+    def position(self, job):
+        # 1-based place in the wait queue; 0 once the job has left it
+        return self.queue.index(job) + 1 if job.state == "queued" else 0
+
+    def estimate(self, job=None):
+        """Expected seconds until the job (or one submitted now) has its answer.
+
+        Returns the median ("eta") and the 90th percentile ("eta_p90") estimate.
+        """
+        with self.condition:
+            return self._estimate(job)
+
+    def snapshot(self):
+        with self.condition:
+            stages = {}
+            for name, values in self.timings.items():
+                stages[name] = {
+                    "count": len(values),
+                    "p50": round(percentile(values, 0.5) or 0.0, 3),
+                    "p90": round(percentile(values, 0.9) or 0.0, 3),
+                }
+            return {
+                "workers": self.workers,
+                "running": len(self.running),
+                "queued": len(self.queue),
+                "max_queue": self.max_queue,
+                "stages": stages,
+            }
+
+    def _stage_seconds(self, stage, fraction):
+        seconds = percentile(self.timings[stage], fraction)
+        return DEFAULT_STAGE_SECONDS[stage] if seconds is None else seconds
+
+    def _remaining(self, job, fraction, now):
+        # Expected time left for a running job: the rest of its current stage plus later stages
+        names = [stage for stage, _ in STAGES]
+        current = names.index(job.stage)
+        left = max(0.0, self._stage_seconds(job.stage, fraction) - (now - job.stage_started))
+        return left + sum(self._stage_seconds(stage, fraction) for stage in names[current + 1:])
+
+    def _estimate(self, job=None):
+        if job is not None and job.done:
+            return {"eta": 0.0, "eta_p90": 0.0}
+        now = time.time()
+        estimate = {}
+        for name, fraction in [("eta", 0.5), ("eta_p90", 0.9)]:
+            service = sum(self._stage_seconds(stage, fraction) for stage, _ in STAGES)
+            if job is not None and job.state == "running":
+                estimate[name] = round(self._remaining(job, fraction, now), 1)
+                continue
+            # Simulate the queue: each worker is free once its current job is expected to end
+            free = [self._remaining(running, fraction, now) for running in self.running.values()]
+            free += [0.0] * (self.workers - len(free))
+            heapq.heapify(free)
+            ahead = self.position(job) - 1 if job is not None else len(self.queue)
+            for _ in range(ahead):
+                heapq.heappush(free, heapq.heappop(free) + service)
+            estimate[name] = round(heapq.heappop(free) + service, 1)
+        return estimate
+
+    def _purge(self, now):
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and now - job.finished > self.keep_finished]:
+            del self.jobs[job_id]
+
+    def _abandoned(self, job):
+        return time.time() - job.last_seen > self.abandon_after
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.finished = time.time()
+        self.running.pop(job.id, None)
+        self.condition.notify_all()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                job = self.queue.popleft()
+                if job.cancelled.is_set() or self._abandoned(job):
+                    self._finish(job, "cancelled")
+                    continue
+                job.state = "running"
+                job.started = job.stage_started = time.time()
+                job.stage = STAGES[0][0]
+                self.running[job.id] = job
+                if job.record_timings:
+                    self.timings["wait"].append(job.started - job.created)
+                self.condition.notify_all()
+            self._run(job)
+
+    def _run(self, job):
+        stage_ends = {event: stage for stage, event in STAGES}
+        try:
+            events = self.run(job)
+            for event in events:
+                with self.condition:
+                    if job.cancelled.is_set() or self._abandoned(job):
+                        job.cancelled.set()
+                        break
+                    now = time.time()
+                    if event["event"] in stage_ends and stage_ends[event["event"]] == job.stage:
+                        if job.record_timings:
+                            self.timings[job.stage].append(now - job.stage_started)
+                        names = [stage for stage, _ in STAGES]
+                        following = names.index(job.stage) + 1
+                        if following < len(names):
+                            job.stage, job.stage_started = names[following], now
+                    job.events.append(event)
+                    self.condition.notify_all()
+            # Closing the generator stops generation (and the Ollama request) early
+            events.close()
+        except Exception as e:
+            with self.condition:
+                job.events.append({"event": "failed", "error": str(e)})
+                self._finish(job, "failed", str(e))
+            return
+        with self.condition:
+            self._finish(job, "cancelled" if job.cancelled.is_set() else "done")
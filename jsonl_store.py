@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+import argparse
+import json
+import os
+
+
+def write_sidecar(sidecar_path, records, size):
+    tmp_path = sidecar_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"records": records, "bytes": size}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, sidecar_path)
+
+
+class JsonlStore:
+    """Append-only JSON Lines file of bug records.
+
+    A small sidecar (`<path>.offset`) remembers how many records and bytes were
+    durably written at the last fsync, so opening the store only has to look at
+    whatever was appended after that point instead of parsing the whole file.
+    """
+
+    def __init__(self, path, fsync_every=500):
+        self.path = path
+        self.sidecar_path = path + ".offset"
+        self.fsync_every = fsync_every
+        self.count = self._recover()
+        self.file = open(path, 'ab')
+        self.pending = 0
+
+    def _read_sidecar(self):
+        try:
+            with open(self.sidecar_path, 'r') as f:
+                state = json.load(f)
+            return int(state['records']), int(state['bytes'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_sidecar(self, size):
+        write_sidecar(self.sidecar_path, self.count, size)
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            open(self.path, 'ab').close()
+        size = os.path.getsize(self.path)
+
+        count, good_bytes = 0, 0
+        state = self._read_sidecar()
+        if state is not None and state[1] <= size:
+            count, good_bytes = state
+
+        # Only the tail written after the last fsync can be torn; keep every complete
+        # line and cut the file after the last one.
+        with open(self.path, 'rb') as f:
+            f.seek(good_bytes)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                count += 1
+                good_bytes += len(line)
+
+        if good_bytes < size:
+            print(f"Truncating {size - good_bytes} bytes of incomplete data at the end of '{self.path}'.")
+            os.truncate(self.path, good_bytes)
+        self.count = count
+        self._write_sidecar(good_bytes)
+        return count
+
+    def append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.count += 1
+        self.pending += 1
+        if self.pending >= self.fsync_every:
+            self.commit()
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._write_sidecar(self.file.tell())
+        self.pending = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.commit()
+        self.file.close()
+
+
+def iter_records(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(path, chunk_size=1 << 20):
+    """Yields the elements of a JSON array file one at a time, so the whole file never has to be in memory.
+
+    Raises ValueError if the file is not a well-formed array, including one cut off
+    before its closing ']'.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, position, eof = '', 0, False
+
+        def peek():
+            # The next character after whitespace, reading more as needed; None at the end of the file
+            nonlocal buffer, position, eof
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n':
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if eof:
+                    return None
+                buffer, position = f.read(chunk_size), 0
+                eof = not buffer
+
+        if peek() != '[':
+            raise ValueError(f"'{path}' is not a JSON array")
+        position += 1
+        if peek() == ']':
+            return
+        while True:
+            char = peek()
+            if char is None:
+                raise ValueError(f"'{path}' ends before the closing ']' of its array")
+            if char in ',]':
+                raise ValueError(f"'{path}' is not a valid JSON array: unexpected '{char}'")
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+                # A number or literal at the end of the buffer may continue in the next chunk
+                complete = eof or end < len(buffer) or isinstance(record, (dict, list, str))
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # The element continues past the buffer; read more and try again
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield record
+            position = end
+
+            separator = peek()
+            if separator == ']':
+                return
+            if separator is None:
+                raise ValueError(f"'{path}' ends before the closing ']' of its array")
+            if separator != ',':
+                raise ValueError(f"'{path}' is not a valid JSON array: expected ',' or ']', found '{separator}'")
+            position += 1
+
+
+def iter_bugs(path):
+    # Accepts the legacy JSON array, JSON Lines and a bug_store.BugStore database
+    with open(path, 'rb') as f:
+        head = chunk = f.read(64)
+        # The first non-whitespace byte tells a JSON array from JSON Lines, however much whitespace leads
+        while chunk and not chunk.strip():
+            chunk = f.read(1 << 16)
+        first = chunk.lstrip()[:1]
+    if head.startswith(b"SQLite format 3\0"):
+        from bug_store import iter_store
+        return iter_store(path)
+    if first == b'[':
+        return iter_json_array(path)
+    return iter_records(path)
+
+
+def compact(path, key='bug_number'):
+    """Drops superseded records so each key appears once.
+
+    Updates are appended to the end of the store; compaction keeps every key at the
+    position it was first written (so offset resume stays valid) with the content of
+    its latest version. Records without a key (e.g. from old exports) are kept where
+    they are. Returns the number of records dropped.
+    """
+    latest = {}
+    total = 0
+    keyless = 0
+    with open(path, 'rb') as f:
+        position = 0
+        for line in f:
+            record_key = json.loads(line).get(key)
+            if record_key in (None, ""):
+                keyless += 1
+            else:
+                latest[record_key] = (position, len(line))
+            position += len(line)
+            total += 1
+    kept = len(latest) + keyless
+    if kept == total:
+        return 0
+
+    tmp_path = path + ".compact"
+    written = set()
+    with open(path, 'rb') as src, open(path, 'rb') as lookup, open(tmp_path, 'wb') as dst:
+        for line in src:
+            record_key = json.loads(line).get(key)
+            if record_key in (None, ""):
+                dst.write(line)
+                continue
+            if record_key in written:
+                continue
+            written.add(record_key)
+            position, length = latest[record_key]
+            lookup.seek(position)
+            dst.write(lookup.read(length))
+        dst.flush()
+        os.fsync(dst.fileno())
+        size = dst.tell()
+    os.replace(tmp_path, path)
+
+    # Point the sidecar at the compacted file so the next open does not rescan it
+    write_sidecar(path + ".offset", kept, size)
+    return total - kept
+
+
+def json_to_jsonl(src, dst):
+    if os.path.exists(dst) and os.path.getsize(dst) > 0:
+        raise FileExistsError(f"'{dst}' already exists; refusing to append a second copy.")
+    # Streams the array, so a legacy export of any size converts in constant memory
+    store = JsonlStore(dst)
+    count = 0
+    try:
+        for bug in iter_json_array(src):
+            store.append(bug)
+            count += 1
+    finally:
+        store.close()
+    return count
+
+
+def jsonl_to_json(src, dst):
+    count = 0
+    tmp_path = dst + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for bug in iter_records(src):
+            f.write(",\n" if count else "\n")
+            f.write(json.dumps(bug, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    os.replace(tmp_path, dst)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between the legacy JSON array and the JSONL bug store.")
+    parser.add_argument('direction', choices=['to-jsonl', 'to-json'])
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    args = parser.parse_args()
+
+    if args.direction == 'to-jsonl':
+        converted = json_to_jsonl(args.src, args.dst)
+    else:
+        converted = jsonl_to_json(args.src, args.dst)
+    print(f"Converted {converted} bug reports from '{args.src}' to '{args.dst}'.")
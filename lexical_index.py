@@ -0,0 +1,182 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from bug_filters import FILTER_FIELDS
+
+LEXICAL_DB = "lexical_index.sqlite3"
+
+# "bug 123456", "bug #123456", "bsc#123456", "boo#123456" and show_bug.cgi links
+BUG_NUMBER_PATTERN = re.compile(r"(?:\bbug\s*#?\s*|\b(?:bsc|boo|bnc)\s*#\s*|show_bug\.cgi\?id=)(\d{3,9})\b", re.IGNORECASE)
+TERM_PATTERN = re.compile(r"\w+")
+# Words that match most bugs and only slow down the OR query
+STOPWORDS = frozenset(
+    "a an and are as at be bug bugs but by can could did do does for from had has have how i if in is it its "
+    "me my not of on or should so that the their there these this to was we were what when where which who "
+    "why will with would you your".split()
+)
+RRF_K = 60  # damping constant of reciprocal rank fusion
+METADATA_COLUMNS = {"product": "TEXT", "component": "TEXT", "version": "TEXT", "status": "TEXT", "reported": "INTEGER"}
+
+
+def mentioned_bug_numbers(text):
+    numbers = []
+    for match in BUG_NUMBER_PATTERN.finditer(text):
+        number = int(match.group(1))
+        if number not in numbers:
+            numbers.append(number)
+    return numbers
+
+
+def query_terms(text):
+    terms = []
+    for term in TERM_PATTERN.findall(text.lower()):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def filter_clause(filters):
+    # SQL conditions on the bugs table matching bug_filters.build_where()
+    conditions, params = [], []
+    for field in FILTER_FIELDS:
+        values = filters.get(field)
+        if values:
+            conditions.append(f"bugs.{field} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+    if filters.get("reported_after") is not None:
+        conditions.append("bugs.reported >= ?")
+        params.append(filters["reported_after"])
+    if filters.get("reported_before") is not None:
+        conditions.append("bugs.reported < ?")
+        params.append(filters["reported_before"])
+    return conditions, params
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merges ranked lists of IDs; an ID scores 1 / (k + rank) for every list it is in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """Full bug texts keyed by bug_number, with an FTS5 index for BM25 keyword search.
+
+    The FTS5 table uses the bugs table as external content, so every text is stored
+    once; triggers keep the two in sync. The filterable bug fields are stored next to
+    the text, so keyword search honours the same filters as vector search.
+    """
+
+    def __init__(self, path=LEXICAL_DB):
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS bugs (
+                    bug_number INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    content_hash TEXT NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS bugs_fts USING fts5(
+                    title, text, content='bugs', content_rowid='bug_number'
+                );
+                CREATE TRIGGER IF NOT EXISTS bugs_ai AFTER INSERT ON bugs BEGIN
+                    INSERT INTO bugs_fts (rowid, title, text) VALUES (new.bug_number, new.title, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS bugs_ad AFTER DELETE ON bugs BEGIN
+                    INSERT INTO bugs_fts (bugs_fts, rowid, title, text) VALUES ('delete', old.bug_number, old.title, old.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS bugs_au AFTER UPDATE ON bugs BEGIN
+                    INSERT INTO bugs_fts (bugs_fts, rowid, title, text) VALUES ('delete', old.bug_number, old.title, old.text);
+                    INSERT INTO bugs_fts (rowid, title, text) VALUES (new.bug_number, new.title, new.text);
+                END;
+            """)
+            # Indexes built before the metadata columns existed get them here; their rows
+            # are rewritten on the next indexer run since the hash covers the metadata
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(bugs)")}
+            for column, column_type in METADATA_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE bugs ADD COLUMN {column} {column_type}")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS bugs_{column} ON bugs ({column})")
+
+    @staticmethod
+    def text_hash(title, text, metadata):
+        return hashlib.sha1(f"{title}\0{text}\0{json.dumps(metadata, sort_keys=True)}".encode("utf-8")).hexdigest()
+
+    def update(self, rows):
+        """Stores (bug_number, title, text, metadata) rows that are new or changed; returns how many."""
+        rows = [
+            (number, title, text, self.text_hash(title, text, metadata), *(metadata.get(column) for column in METADATA_COLUMNS))
+            for number, title, text, metadata in rows
+        ]
+        if not rows:
+            return 0
+        with self.lock:
+            known = {}
+            for i in range(0, len(rows), 500):
+                part = [row[0] for row in rows[i:i + 500]]
+                placeholders = ",".join("?" * len(part))
+                known.update(self.conn.execute(
+                    f"SELECT bug_number, content_hash FROM bugs WHERE bug_number IN ({placeholders})", part
+                ))
+            changed = [row for row in rows if known.get(row[0]) != row[3]]
+            columns = ", ".join(["bug_number", "title", "text", "content_hash", *METADATA_COLUMNS])
+            updates = ", ".join(f"{column} = excluded.{column}" for column in ["title", "text", "content_hash", *METADATA_COLUMNS])
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO bugs ({columns}) VALUES ({', '.join('?' * (4 + len(METADATA_COLUMNS)))}) "
+                    f"ON CONFLICT(bug_number) DO UPDATE SET {updates}",
+                    changed,
+                )
+        return len(changed)
+
+    def delete(self, bug_numbers):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM bugs WHERE bug_number = ?", ((int(number),) for number in bug_numbers))
+
+    def get(self, bug_numbers):
+        """Returns (bug_number, text) for the bugs that exist, in the order asked for."""
+        bug_numbers = [int(number) for number in bug_numbers]
+        if not bug_numbers:
+            return []
+        placeholders = ",".join("?" * len(bug_numbers))
+        with self.lock:
+            found = dict(self.conn.execute(f"SELECT bug_number, text FROM bugs WHERE bug_number IN ({placeholders})", bug_numbers))
+        return [(number, found[number]) for number in bug_numbers if number in found]
+
+    def search(self, question, limit=10, filters=None):
+        """Bug numbers ranked by BM25 over the question's terms, title matches weighted double."""
+        terms = query_terms(question)
+        if not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        conditions, params = filter_clause(filters or {})
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bugs_fts.rowid FROM bugs_fts JOIN bugs ON bugs.bug_number = bugs_fts.rowid "
+                f"WHERE bugs_fts MATCH ?{''.join(' AND ' + condition for condition in conditions)} "
+                "ORDER BY bm25(bugs_fts, 2.0, 1.0) LIMIT ?",
+                (match, *params, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def facets(self):
+        """Distinct values of every filterable text field."""
+        with self.lock:
+            return {
+                field: [row[0] for row in self.conn.execute(f"SELECT DISTINCT {field} FROM bugs WHERE {field} IS NOT NULL ORDER BY {field}")]
+                for field in FILTER_FIELDS
+            }
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM bugs").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
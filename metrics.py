@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Seconds; wide enough for a cold model load at the top end
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.extend(self._samples(dict(zip(self.labelnames, key)), value))
+        return lines
+
+    def _samples(self, labels, value):
+        return [f"{self.name}{format_labels(labels)} {format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def _samples(self, labels, value):
+        counts, total = value
+        lines = [
+            f"{self.name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{self.name}_count{format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "".join(line + "\n" for metric in metrics for line in metric.render())
+
+    def write_textfile(self, path):
+        # Written atomically so a reader never sees half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+
+class Trace:
+    """Timeline of one request: named spans with their start offset, duration and attributes."""
+
+    def __init__(self, name, trace_id=None, started=None, **attributes):
+        self.id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.started = started or time.time()
+        self.attributes = attributes
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, name, start, duration, **attributes):
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "start": round(start - self.started, 6),
+                "duration": round(duration, 6),
+                **attributes,
+            })
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "started": self.started,
+                "duration": round(time.time() - self.started, 6),
+                **self.attributes,
+                "spans": list(self.spans),
+            }
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{self.id}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+@contextmanager
+def timed(histogram, trace=None, **labels):
+    """Observes the block's duration in histogram and adds it as a span to trace.
+
+    The yielded dict collects attributes for the span. A block left by an exception
+    (including a closed generator) only shows up in the trace, so cancelled work
+    does not skew the histogram.
+    """
+    attributes = {}
+    name = labels.get("stage", histogram.name)
+    start = time.time()
+    try:
+        yield attributes
+    except BaseException as e:
+        if trace is not None:
+            trace.add(name, start, time.time() - start, error=type(e).__name__, **attributes)
+        raise
+    duration = time.time() - start
+    histogram.observe(duration, **labels)
+    if trace is not None:
+        trace.add(name, start, duration, **attributes)
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+
+class QueryCache:
+    """Answer cache in front of the RAG chain.
+
+    The exact tier is an LRU keyed by (normalized question, scope), where scope holds
+    everything besides the question that changes the answer (k, filters). The semantic
+    tier reuses an answer of the same scope whose question embedding lies within
+    max_distance (cosine distance) of the new one. Entries expire after ttl seconds, at most max_entries
+    are kept, and everything is dropped when the index version changes.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, max_distance=0.05):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.index_version = None
+        self.lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    def check_index_version(self, version):
+        with self.lock:
+            if version != self.index_version:
+                if self.index_version is not None:
+                    self.stats["invalidations"] += 1
+                self.entries.clear()
+                self.index_version = version
+
+    def _expire(self, now):
+        for key in [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl]:
+            del self.entries[key]
+
+    def get_exact(self, question, scope):
+        # A miss is not counted here: the caller either tries the semantic tier next or
+        # calls count_miss()
+        key = (normalize_question(question), scope)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl:
+                return None
+            self.entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return entry["result"]
+
+    def count_miss(self):
+        # For lookups that end after the exact tier, e.g. questions about a bug number
+        with self.lock:
+            self.stats["misses"] += 1
+
+    def get_semantic(self, vector, scope):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self.lock:
+            self._expire(time.time())
+            candidates = [(key, entry) for key, entry in self.entries.items() if key[1] == scope and entry["vector"] is not None]
+            if not candidates:
+                self.stats["misses"] += 1
+                return None
+            distances = 1.0 - np.stack([entry["vector"] for _, entry in candidates]) @ vector
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                self.stats["misses"] += 1
+                return None
+            key, entry = candidates[best]
+            self.entries.move_to_end(key)
+            self.stats["semantic_hits"] += 1
+            return entry["result"]
+
+    def put(self, question, scope, vector, result):
+        # Without a vector (e.g. answers about a bug number) the entry only serves exact hits
+        if vector is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        key = (normalize_question(question), scope)
+        with self.lock:
+            self.entries[key] = {"result": result, "vector": vector, "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hits = lookups - self.stats["misses"]
+            return {**self.stats, "size": len(self.entries), "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
@@ -1,22 +1,503 @@
+import logging
+import os
+import threading
 import time
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import OllamaLLM
-from langchain.chains import RetrievalQA
-
-# Load vector DB and embedding model
-embedding = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-vectorstore = Chroma(persist_directory="chroma_db", embedding_function=embedding)
-
-# Set up local model via Ollama
-llm = OllamaLLM(model="mistral", temperature=0.1)
-
-# RAG chain
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=vectorstore.as_retriever(search_kwargs={"k": 3}),
-    return_source_documents=True
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from bug_filters import build_where, filters_key, parse_filters
+from chunking import collapse_chunks
+from compact_store import COMPACT_DIR, DEFAULT_NPROBE
+from context_budget import CONTEXT_TOKENS, STACK_TRACE_LINES, compress_documents
+from lexical_index import LEXICAL_DB, LexicalIndex, mentioned_bug_numbers, query_terms, reciprocal_rank_fusion
+from metrics import REGISTRY, timed
+from query_cache import QueryCache
+
+# Importing this module is cheap: the embedding model, the vector store and the
+# Ollama client are created on first use (or by warm_up()) and shared afterwards.
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_CACHE_DIR = "embedding_cache"
+CHROMA_DIR = "chroma_db"
+# "chroma", or "compact" for the read-only memory-mapped store written by compact_store.py
+VECTOR_BACKEND = "chroma"
+COMPACT_STORE_DIR = COMPACT_DIR
+COMPACT_NPROBE = DEFAULT_NPROBE  # IVF lists scanned per query, if the store has them
+LLM_MODEL = "mistral"
+OLLAMA_KEEP_ALIVE = "30m"  # keep the model loaded between questions
+RETRIEVE_K = 3
+FETCH_K = 12
+# Built by index_bugs_to_chroma.py; without it questions only go through vector search
+LEXICAL_INDEX_DB = LEXICAL_DB
+LEXICAL_K = 12  # BM25 candidates fused with the vector results
+LOOKUP_MAX_CHARS = 16000  # of a bug fetched by number; the context budget then picks what goes into the prompt
+# Retrieved text is compressed to about this many tokens before it goes into the prompt
+# (None sends it as it is); see context_budget.py
+CONTEXT_BUDGET = CONTEXT_TOKENS
+CONTEXT_STACK_TRACE_LINES = STACK_TRACE_LINES
+# Answers generated at once by query_bugzilla_batch(), like app.LLM_WORKERS; Ollama only
+# runs them in parallel up to its OLLAMA_NUM_PARALLEL, the rest wait on the server
+BATCH_LLM_CONCURRENCY = 1
+
+# The prompt of RetrievalQA's "stuff" chain; retrieval and generation are run as separate
+# steps so sources can be shown and tokens streamed while the answer is generated
+QA_PROMPT = (
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\n"
+    "Question: {question}\n"
+    "Helpful Answer:"
+)
+
+# Answers are reused for identical questions and for questions whose embedding is
+# within SEMANTIC_CACHE_DISTANCE (cosine) of a cached one
+CACHE_MAX_ENTRIES = 512
+CACHE_TTL = 3600
+SEMANTIC_CACHE_DISTANCE = 0.05
+# The cache is dropped when the indexer's checkpoint changes, which it does after every
+# write to Chroma (chroma.sqlite3 itself is touched merely by opening the store)
+INDEX_FILES = ["index_checkpoint.sqlite3"]
+
+logger = logging.getLogger(__name__)
+
+_init_lock = threading.Lock()
+_embedding = None
+_vectorstore = None
+_llm = None
+_lexical = None
+_facets = (None, {})
+
+query_cache = QueryCache(CACHE_MAX_ENTRIES, CACHE_TTL, SEMANTIC_CACHE_DISTANCE)
+
+STAGE_SECONDS = REGISTRY.histogram("bugzilla_rag_stage_seconds", "Seconds spent per stage of a question.", ["stage"])
+FIRST_TOKEN_SECONDS = REGISTRY.histogram("bugzilla_rag_first_token_seconds", "Seconds from a question to its first answer token.")
+RETRIEVAL_K = REGISTRY.histogram("bugzilla_rag_retrieval_k", "Bugs requested per question.", buckets=(1, 2, 3, 5, 8, 13, 20))
+DOCUMENT_CHARS = REGISTRY.histogram(
+    "bugzilla_rag_document_chars", "Characters per retrieved document.", buckets=(250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "bugzilla_rag_llm_tokens", "Prompt and completion tokens per answer.", ["kind"],
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
 )
+CONTEXT_TOKENS_HISTOGRAM = REGISTRY.histogram(
+    "bugzilla_rag_context_tokens", "Estimated tokens of retrieved text before and after compression.", ["stage"],
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000, 10000),
+)
+CACHE_LOOKUPS = REGISTRY.counter("bugzilla_rag_cache_lookups_total", "Query cache lookups by result.", ["result"])
+BATCH_SECONDS = REGISTRY.histogram("bugzilla_rag_batch_stage_seconds", "Seconds spent per stage of a question batch.", ["stage"])
+BATCH_QUESTIONS = REGISTRY.histogram(
+    "bugzilla_rag_batch_questions", "Questions per batch.", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+
+class BugRetriever(BaseRetriever):
+    """Retrieves extra chunks and keeps only the best-matching chunk of each bug.
+
+    With a lexical index, the bugs found by vector search and by BM25 are merged by
+    reciprocal rank fusion. Filters (see bug_filters.py) restrict both searches.
+    """
+    vectorstore: VectorStore
+    lexical: Any = None
+    k: int = 3
+    fetch_k: int = 12
+    lexical_k: int = 12
+    filters: dict = {}
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.rank(query, self.vectorstore.similarity_search(query, k=self.fetch_k, filter=build_where(self.filters)))
+
+    def rank(self, query, chunks):
+        """The k best bugs, given the fetch_k chunks vector search found for query."""
+        if self.lexical is None:
+            return collapse_chunks(chunks, self.k)
+
+        dense = collapse_chunks(chunks, self.fetch_k)
+        sparse = [str(number) for number in self.lexical.search(query, self.lexical_k, self.filters)]
+        by_bug = {doc.metadata.get("bug_id"): doc for doc in dense}
+        ranked = reciprocal_rank_fusion([list(by_bug), sparse])[:self.k]
+
+        # Keyword-only hits are represented by their chunk sharing the most words with the query
+        missing = [bug_id for bug_id in ranked if bug_id not in by_bug]
+        if missing:
+            by_bug.update(best_chunks(self.vectorstore, missing, query_terms(query)))
+        return [by_bug[bug_id] for bug_id in ranked if bug_id in by_bug]
+
+
+def best_chunks(vectorstore, bug_ids, terms):
+    found = vectorstore.get(where={"bug_id": {"$in": bug_ids}}, include=["documents", "metadatas"])
+    best = {}
+    for text, metadata in zip(found["documents"], found["metadatas"]):
+        words = set(text.lower().split())
+        score = sum(term in words for term in terms)
+        bug_id = metadata.get("bug_id")
+        if bug_id not in best or score > best[bug_id][0]:
+            best[bug_id] = (score, Document(page_content=text, metadata=metadata))
+    return {bug_id: doc for bug_id, (_, doc) in best.items()}
+
+
+def similarity_search_many(vectorstore, vectors, k, where=None):
+    """Chunks for every query vector from a single multi-query search."""
+    if hasattr(vectorstore, "similarity_search_by_vectors"):
+        return vectorstore.similarity_search_by_vectors(vectors, k, where)
+    # langchain_chroma searches one vector per call; its collection takes many at once
+    found = vectorstore._collection.query(
+        query_embeddings=vectors, n_results=k, where=where, include=["documents", "metadatas"]
+    )
+    return [
+        [Document(id=doc_id, page_content=text, metadata=metadata or {}) for doc_id, text, metadata in zip(*hits)]
+        for hits in zip(found["ids"], found["documents"], found["metadatas"])
+    ]
+
+
+class TokenUsage(BaseCallbackHandler):
+    """Collects Ollama's token counts, which arrive with the last chunk of a stream."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def on_llm_end(self, response, **kwargs):
+        info = response.generations[0][0].generation_info if response.generations and response.generations[0] else None
+        for kind, key in [("prompt", "prompt_eval_count"), ("completion", "eval_count")]:
+            if info and info.get(key) is not None:
+                self.counts[kind] = info[key]
+
+
+def get_embedding():
+    global _embedding
+    if _embedding is None:
+        with _init_lock:
+            if _embedding is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                from embedding_cache import CachedEmbeddings, EmbeddingCache
+                # Repeated questions are served from the embedding cache
+                _embedding = CachedEmbeddings(
+                    HuggingFaceEmbeddings(model_name=EMBED_MODEL), EMBED_MODEL, EmbeddingCache(EMBED_CACHE_DIR)
+                )
+    return _embedding
+
+
+def get_vectorstore():
+    global _vectorstore
+    embedding = get_embedding()
+    if VECTOR_BACKEND == "compact":
+        # A re-exported store is picked up on the next question
+        if _vectorstore is None or _vectorstore.store.stale():
+            with _init_lock:
+                if _vectorstore is None or _vectorstore.store.stale():
+                    from compact_store import CompactVectorStore
+                    previous = _vectorstore
+                    _vectorstore = CompactVectorStore(COMPACT_STORE_DIR, embedding, COMPACT_NPROBE)
+                    if previous is not None:
+                        # Its memmaps go once the searches still using it are done
+                        previous.store.close()
+        return _vectorstore
+    if _vectorstore is None:
+        with _init_lock:
+            if _vectorstore is None:
+                from langchain_chroma import Chroma
+                _vectorstore = Chroma(persist_directory=CHROMA_DIR, embedding_function=embedding)
+    return _vectorstore
+
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_ollama import OllamaLLM
+                _llm = OllamaLLM(model=LLM_MODEL, temperature=0.1, keep_alive=OLLAMA_KEEP_ALIVE)
+    return _llm
+
+
+def get_lexical():
+    global _lexical
+    if _lexical is None and os.path.exists(LEXICAL_INDEX_DB):
+        with _init_lock:
+            if _lexical is None:
+                _lexical = LexicalIndex(LEXICAL_INDEX_DB)
+    return _lexical
+
+
+def get_retriever(k=RETRIEVE_K, filters=None):
+    return BugRetriever(
+        vectorstore=get_vectorstore(), lexical=get_lexical(), k=k, fetch_k=max(FETCH_K, 4 * k),
+        lexical_k=max(LEXICAL_K, 4 * k), filters=filters or {},
+    )
+
+
+def get_facets():
+    # Known products, components, versions and statuses; reread when the index changes
+    global _facets
+    version = index_version()
+    if _facets[0] != version:
+        lexical = get_lexical()
+        _facets = (version, lexical.facets() if lexical is not None else {})
+    return _facets[1]
+
+
+def resolve_filters(question, filters=None):
+    # Filters given explicitly (e.g. form fields) win over those parsed from the question
+    return {**parse_filters(question, get_facets()), **(filters or {})}
+
+
+def lookup_bugs(question, k=RETRIEVE_K):
+    # Questions naming bug numbers get those bugs directly, without embedding or searching
+    numbers = mentioned_bug_numbers(question)
+    lexical = get_lexical()
+    if not numbers or lexical is None:
+        return []
+    return [
+        Document(page_content=text[:LOOKUP_MAX_CHARS], metadata={"bug_id": str(number), "match": "bug_number"})
+        for number, text in lexical.get(numbers[:k])
+    ]
+
+
+def compress_context(question, documents, vector=None, span=None):
+    """Texts of the documents, fitted into CONTEXT_BUDGET tokens around the question."""
+    texts = [doc.page_content for doc in documents]
+    if CONTEXT_BUDGET is None or not texts:
+        return texts
+    embedding = get_embedding()
+    if vector is None:
+        vector = embedding.embed_query(question)
+    # Sentences bypass the persistent cache: they are rarely seen twice and would only
+    # evict the indexer's vectors
+    texts, (before, after) = compress_documents(
+        texts, vector, embedding.embed_documents_uncached, CONTEXT_BUDGET, CONTEXT_STACK_TRACE_LINES
+    )
+    CONTEXT_TOKENS_HISTOGRAM.observe(before, stage="retrieved")
+    CONTEXT_TOKENS_HISTOGRAM.observe(after, stage="prompt")
+    if span is not None:
+        span.update(context_tokens=after, tokens_saved=before - after)
+    logger.info(f"Context of {len(texts)} documents: ~{before} tokens, ~{after} after compression ({before - after} saved)")
+    return texts
+
+
+def build_prompt(question, texts):
+    return QA_PROMPT.format(context="\n\n".join(texts), question=question)
+
+
+def warm_up():
+    """Loads every component and exercises it once; returns seconds spent per step."""
+    timings = {}
+
+    start = time.time()
+    # Bypass the cache so the model itself runs its first forward pass
+    get_embedding().embed_documents_uncached(["warm-up"])
+    timings["embedding"] = time.time() - start
+
+    start = time.time()
+    get_vectorstore().similarity_search("warm-up", k=1)
+    timings["vector_store"] = time.time() - start
+
+    start = time.time()
+    # Makes Ollama load the model; keep_alive keeps it resident afterwards
+    get_llm().invoke("Reply with OK.")
+    timings["llm"] = time.time() - start
+
+    timings["total"] = sum(timings.values())
+    return timings
+
+
+def index_version():
+    version = []
+    paths = INDEX_FILES + ([os.path.join(COMPACT_STORE_DIR, "manifest.json")] if VECTOR_BACKEND == "compact" else [])
+    for path in paths:
+        for name in (path, path + "-wal"):
+            try:
+                version.append(os.stat(name).st_mtime_ns)
+            except OSError:
+                version.append(None)
+    return tuple(version)
+
+
+def stream_bugzilla(question, k=RETRIEVE_K, trace=None, filters=None):
+    """Yields a "sources" event once retrieval is done, then "token" events, then "done".
+
+    filters (normalized as by bug_filters.normalize_filters) are combined with those
+    parsed from the question; the "sources" event reports the ones applied. Stage
+    timings go to the metrics registry and, if given, to trace.
+    """
+    start_time = time.time()
+    query_cache.check_index_version(index_version())
+    RETRIEVAL_K.observe(k)
+    filters = resolve_filters(question, filters)
+    scope = (k, filters_key(filters))
+    if trace is not None and filters:
+        trace.attributes["filters"] = filters
+
+    cached, cache_tier = query_cache.get_exact(question, scope), "exact"
+    vector = None
+    documents = []
+    if cached is None:
+        with timed(STAGE_SECONDS, trace, stage="lookup") as span:
+            documents = lookup_bugs(question, k)
+            span["documents"] = len(documents)
+        if documents:
+            query_cache.count_miss()
+    if cached is None and not documents:
+        # The query embedding is cached on disk, so the retriever does not compute it again
+        with timed(STAGE_SECONDS, trace, stage="embed"):
+            vector = get_embedding().embed_query(question)
+        cached, cache_tier = query_cache.get_semantic(vector, scope), "semantic"
+    CACHE_LOOKUPS.inc(result=cache_tier if cached is not None else "miss")
+    if trace is not None:
+        trace.attributes["cached"] = cache_tier if cached is not None else None
+    if cached is not None:
+        yield {"event": "sources", "documents": cached["source_documents"], "filters": filters, "elapsed_time": time.time() - start_time}
+        yield {"event": "token", "text": cached["result"]}
+        yield {"event": "done", "result": cached["result"], "elapsed_time": time.time() - start_time, "cached": cache_tier}
+        return
+
+    if not documents:
+        with timed(STAGE_SECONDS, trace, stage="retrieve") as span:
+            documents = get_retriever(k, filters).invoke(question)
+            span["documents"] = len(documents)
+    for doc in documents:
+        DOCUMENT_CHARS.observe(len(doc.page_content))
+    yield {"event": "sources", "documents": documents, "filters": filters, "elapsed_time": time.time() - start_time}
+
+    with timed(STAGE_SECONDS, trace, stage="prompt") as span:
+        prompt = build_prompt(question, compress_context(question, documents, vector, span))
+        span["chars"] = len(prompt)
+
+    usage = TokenUsage()
+    parts = []
+    with timed(STAGE_SECONDS, trace, stage="generate") as span:
+        for token in get_llm().stream(prompt, config={"callbacks": [usage]}):
+            if not parts:
+                FIRST_TOKEN_SECONDS.observe(time.time() - start_time)
+            parts.append(token)
+            yield {"event": "token", "text": token}
+        # Without counts from the backend, every streamed chunk is taken as one token
+        usage.counts.setdefault("completion", len(parts))
+        span.update(usage.counts)
+    for kind, count in usage.counts.items():
+        LLM_TOKENS.observe(count, kind=kind)
+    answer = "".join(parts)
+
+    query_cache.put(question, scope, vector, {"result": answer, "source_documents": documents})
+    yield {"event": "done", "result": answer, "elapsed_time": time.time() - start_time, "cached": None}
+
+
+def query_bugzilla(question, k=RETRIEVE_K, filters=None):
+    result = {}
+    for event in stream_bugzilla(question, k, filters=filters):
+        if event["event"] == "sources":
+            result["source_documents"] = event["documents"]
+            result["filters"] = event["filters"]
+        elif event["event"] == "done":
+            result.update(result=event["result"], elapsed_time=event["elapsed_time"], cached=event["cached"])
+    return result
+
+
+def generate_answer(question, documents, vector=None):
+    # One blocking LLM call, used by batches
+    with timed(STAGE_SECONDS, stage="prompt"):
+        prompt = build_prompt(question, compress_context(question, documents, vector))
+    usage = TokenUsage()
+    with timed(STAGE_SECONDS, stage="generate") as span:
+        answer = get_llm().invoke(prompt, config={"callbacks": [usage]})
+        span.update(usage.counts)
+    for kind, count in usage.counts.items():
+        LLM_TOKENS.observe(count, kind=kind)
+    return answer
+
+
+def try_generate_answer(result):
+    try:
+        return generate_answer(result["question"], result["source_documents"], result.get("vector")), None
+    except Exception as e:
+        return None, str(e)
+
+
+def query_bugzilla_batch(questions, k=RETRIEVE_K, filters=None, sources_only=False, max_concurrency=BATCH_LLM_CONCURRENCY,
+                         answer=try_generate_answer):
+    """Answers many questions at once; returns one result per question, in order.
+
+    All questions needing vector search are embedded in one forward pass and searched
+    with one multi-query search per distinct set of filters. With sources_only nothing
+    is generated; otherwise answer(result) is called for up to max_concurrency results
+    at a time and returns (answer, None) or (None, error). The app passes one that runs
+    the generation as a job of its scheduler.
+    Each result has "question", "source_documents", "filters" and "cached", plus
+    "result" (or "error" if generation failed) unless sources_only.
+    """
+    start_time = time.time()
+    query_cache.check_index_version(index_version())
+    BATCH_QUESTIONS.observe(len(questions))
+    results = []
+    searches = {}  # filters_key -> indices of the questions to search with those filters
+    for i, question in enumerate(questions):
+        RETRIEVAL_K.observe(k)
+        question_filters = resolve_filters(question, filters)
+        result = {"question": question, "filters": question_filters, "cached": None, "scope": (k, filters_key(question_filters))}
+        results.append(result)
+        cached = query_cache.get_exact(question, result["scope"])
+        if cached is not None:
+            CACHE_LOOKUPS.inc(result="exact")
+            result.update(source_documents=cached["source_documents"], result=cached["result"], cached="exact")
+            continue
+        documents = lookup_bugs(question, k)
+        if documents:
+            CACHE_LOOKUPS.inc(result="miss")
+            query_cache.count_miss()
+            result.update(source_documents=documents, vector=None)
+            continue
+        searches.setdefault(result["scope"][1], []).append(i)
+
+    pending = [i for indices in searches.values() for i in indices]
+    if pending:
+        with timed(BATCH_SECONDS, stage="embed"):
+            vectors = dict(zip(pending, get_embedding().embed_queries([questions[i] for i in pending])))
+        for i in pending:
+            cached = query_cache.get_semantic(vectors[i], results[i]["scope"])
+            CACHE_LOOKUPS.inc(result="semantic" if cached is not None else "miss")
+            results[i]["vector"] = vectors[i]
+            if cached is not None:
+                results[i].update(source_documents=cached["source_documents"], result=cached["result"], cached="semantic")
+
+        with timed(BATCH_SECONDS, stage="retrieve"):
+            for indices in searches.values():
+                indices = [i for i in indices if results[i]["cached"] is None]
+                if not indices:
+                    continue
+                retriever = get_retriever(k, results[indices[0]]["filters"])
+                found = similarity_search_many(
+                    retriever.vectorstore, [vectors[i] for i in indices], retriever.fetch_k, build_where(retriever.filters)
+                )
+                for i, chunks in zip(indices, found):
+                    results[i]["source_documents"] = retriever.rank(questions[i], chunks)
+                    for doc in results[i]["source_documents"]:
+                        DOCUMENT_CHARS.observe(len(doc.page_content))
+
+    if not sources_only:
+        generate = [result for result in results if result["cached"] is None]
+        with timed(BATCH_SECONDS, stage="generate"):
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(generate) or 1))) as executor:
+                answers = executor.map(answer, generate)
+                for result, (text, error) in zip(generate, answers):
+                    if error is not None:
+                        # One failed answer does not fail the rest of the batch
+                        result["error"] = error
+                        continue
+                    result["result"] = text
+                    query_cache.put(
+                        result["question"], result["scope"], result.get("vector"),
+                        {"result": text, "source_documents": result["source_documents"]},
+                    )
+
+    elapsed = time.time() - start_time
+    for result in results:
+        del result["scope"]
+        result.pop("vector", None)
+        if sources_only:
+            result.pop("result", None)
+        result["elapsed_time"] = elapsed
+    return results
+
 
 def get_multiline_input(prompt="Enter your prompt (end with '###' on a new line):\n"):
     print(prompt)
@@ -31,24 +512,35 @@ def get_multiline_input(prompt="Enter your prompt (end with '###' on a new line)
             break
     return "\n".join(lines).strip()
 
-# CLI
-print("🔍 Ask a question about your Bugzilla data. Type '###' on a new line to finish your prompt (Ctrl+C to exit).")
-while True:
-    try:
-        query = get_multiline_input()
-        if not query:
-            continue
 
-        print("⏳ Processing your question, please wait...")
+def format_timings(timings):
+    return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items() if name != "total")
+
+
+def main():
+    print("⏳ Loading models and vector store...")
+    timings = warm_up()
+    print(f"✅ Ready after a cold start of {timings['total']:.2f} seconds ({format_timings(timings)}).")
+
+    print("🔍 Ask a question about your Bugzilla data. Type '###' on a new line to finish your prompt (Ctrl+C to exit).")
+    while True:
+        try:
+            query = get_multiline_input()
+            if not query:
+                continue
+
+            print("⏳ Processing your question, please wait...")
+
+            result = query_bugzilla(query)
+
+            print(f"\n✅ Assistant (responded in {result['elapsed_time']:.2f} seconds):\n{result['result']}")
+            print("\n📄 Top matching bug records:")
+            for i, doc in enumerate(result["source_documents"], 1):
+                print(f"\n--- Match {i} ---\n{doc.page_content[:1000]}...\n")
+        except KeyboardInterrupt:
+            print("\n👋 Goodbye!")
+            break
 
-        start_time = time.time()
-        result = qa_chain.invoke({"query": query})
-        elapsed_time = time.time() - start_time
 
-        print(f"\n✅ Assistant (responded in {elapsed_time:.2f} seconds):\n{result['result']}")
-        print("\n📄 Top matching bug records:")
-        for i, doc in enumerate(result["source_documents"], 1):
-            print(f"\n--- Match {i} ---\n{doc.page_content[:1000]}...\n")
-    except KeyboardInterrupt:
-        print("\n👋 Goodbye!")
-        break
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,9 @@ try:
     import os
     import warnings
     import tqdm
-    from langchain import chains
     from langchain_chroma import Chroma
     from langchain_huggingface import HuggingFaceEmbeddings
     from langchain_ollama import OllamaLLM
-    from langchain.chains import RetrievalQA
     from flask import Flask, request, render_template_string, jsonify
     from query_interface import query_bugzilla
     import markdown2
@@ -19,7 +17,7 @@ try:
     import time
     from collections import deque
     import logging
-    from langchain.docstore.document import Document
+    from langchain_core.documents import Document
     import pickle
 
     print("All imports succeeded. Your environment is correctly set up!")